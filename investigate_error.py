@@ -1,13 +1,16 @@
 import defcon
 import ufo2ft
 import os
+import argparse
 from pathlib import Path
 
 UFO_PATH = "static/NotoSerifJP-Regular.otf.ufo"
 
-def investigate():
-    print(f"Loading UFO: {UFO_PATH}")
-    font = defcon.Font(UFO_PATH)
+# フォント全体で一度だけ試す。失敗したグリフや feature ブロックを絞り込むには
+# src/bisect_compile.py を使う。
+def investigate(ufo_path=UFO_PATH):
+    print(f"Loading UFO: {ufo_path}")
+    font = defcon.Font(ufo_path)
     print(f"Total glyphs in UFO: {len(font)}")
     
     # aalt 機能を一時的に除去して試す
@@ -35,4 +38,6 @@ def investigate():
         traceback.print_exc()
 
 if __name__ == "__main__":
-    investigate()
+    parser = argparse.ArgumentParser(description="Try compiling a whole UFO once (use src/bisect_compile.py to narrow failures down).")
+    parser.add_argument("--input", default=UFO_PATH, help=f"Input UFO directory (default: {UFO_PATH})")
+    investigate(parser.parse_args().input)
@@ -6,6 +6,7 @@ const refreshBtn = document.getElementById('refresh-btn');
 const filterStatus = document.getElementById('filter-status');
 const hiddenCountSpan = document.getElementById('hidden-count');
 const resetFilterBtn = document.getElementById('reset-filter-btn');
+const diffSelect = document.getElementById('diff-select');
 
 let fontsData = [];
 const loadedFonts = new Set();
@@ -133,6 +134,33 @@ sizeSlider.addEventListener('input', () => {
 refreshBtn.addEventListener('click', () => {
     loadedFonts.clear();
     loadFonts();
+    loadDiffs();
+});
+
+// font_diff.py で作った差分のコンタクトシートを選んで開く
+async function loadDiffs() {
+    try {
+        const response = await fetch('/api/diffs');
+        const diffs = await response.json();
+        diffSelect.length = 1;
+        diffs.forEach(diff => {
+            const option = document.createElement('option');
+            option.value = diff.url;
+            option.textContent = `${diff.name} (${diff.visible}/${diff.changed} 変化)`;
+            diffSelect.appendChild(option);
+        });
+        diffSelect.style.display = diffs.length > 0 ? '' : 'none';
+    } catch (error) {
+        console.error('Failed to load diff reports:', error);
+    }
+}
+
+diffSelect.addEventListener('change', () => {
+    if (diffSelect.value) {
+        window.open(diffSelect.value, '_blank');
+        diffSelect.value = '';
+    }
 });
 
 loadFonts();
+loadDiffs();
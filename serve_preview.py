@@ -9,6 +9,7 @@ from fontTools.ttLib import TTFont
 PORT = 8080
 DIST_DIR = Path("dist")
 CACHE_DIR = DIST_DIR / ".cache"
+DIFF_DIR = DIST_DIR / "diff"
 PREVIEW_DIR = Path("preview")
 
 class PreviewRequestHandler(http.server.SimpleHTTPRequestHandler):
@@ -42,6 +43,32 @@ class PreviewRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.wfile.write(json.dumps(fonts).encode())
             return
             
+        if self.path == "/api/diffs":
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+
+            # src/font_diff.py が書き出した差分のコンタクトシート
+            diffs = []
+            if DIFF_DIR.exists():
+                for report in DIFF_DIR.glob("*/diff.json"):
+                    try:
+                        summary = json.loads(report.read_text(encoding="utf-8"))
+                    except (OSError, ValueError):
+                        continue
+                    diffs.append({
+                        "name": report.parent.name,
+                        "url": f"/dist/diff/{report.parent.name}/index.html",
+                        "created": summary.get("created"),
+                        "changed": summary.get("changed"),
+                        "visible": summary.get("visible"),
+                    })
+            diffs.sort(key=lambda x: x["created"] or "", reverse=True)
+
+            self.wfile.write(json.dumps(diffs).encode())
+            return
+
         if self.path.startswith("/dist/"):
             return http.server.SimpleHTTPRequestHandler.do_GET(self)
             
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = ("process", "thread")
+
+
+def gil_enabled():
+    """GIL が有効か（3.13 未満は常に True）"""
+    return getattr(sys, "_is_gil_enabled", lambda: True)()
+
+
+def time_backend(input_path, backend, workers, runs, glyphs=None):
+    """backend でエフェクトを適用する時間（秒）の中央値を返す（毎回フォントを読み直す）"""
+    from processor import FontProcessor
+
+    samples = []
+    for _ in range(runs):
+        processor = FontProcessor(input_path)
+        processor.load()
+        subset = None
+        if glyphs:
+            subset = set(processor._collect_target_names(None)[:glyphs])
+        start = time.perf_counter()
+        processor.process(use_parallel=True, max_workers=workers, subset_glyphs=subset, backend=backend)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def run_child(args):
+    """このインタプリタで各バックエンドを計測し、結果を JSON で標準出力に書く"""
+    sys.path.insert(0, SRC_DIR)
+    result = {"python": sys.version.split()[0], "gil": gil_enabled(), "times": {}}
+    for backend in args.backend:
+        result["times"][backend] = time_backend(args.input, backend, args.workers, args.runs, args.glyphs)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the process and thread backends on GIL and free-threaded interpreters.")
+    parser.add_argument("--input", required=True, help="Input UFO directory or glyph store (.ntgs)")
+    parser.add_argument("--python", action="append", help="Interpreter to benchmark, e.g. python3.13t (repeatable; default: this one)")
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="Backend to benchmark (repeatable; default: both)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="Worker processes / threads")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per measurement (median is reported)")
+    parser.add_argument("--glyphs", type=int, help="Only process the first N target glyphs")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.backend = args.backend or list(BACKENDS)
+
+    if args.child:
+        run_child(args)
+        return
+
+    cmd_args = ["--child", "--input", os.path.abspath(args.input), "--workers", str(args.workers), "--runs", str(args.runs)]
+    for backend in args.backend:
+        cmd_args += ["--backend", backend]
+    if args.glyphs:
+        cmd_args += ["--glyphs", str(args.glyphs)]
+
+    print(f"{args.workers} workers, {args.runs} runs each (median)")
+    for python in args.python or [sys.executable]:
+        # 進捗表示は捨て、最後の行の JSON だけを読む
+        try:
+            out = subprocess.run([python, os.path.abspath(__file__)] + cmd_args, cwd=SRC_DIR,
+                                 capture_output=True, text=True)
+        except OSError as e:
+            print(f"  {python}: failed ({e})")
+            continue
+        if out.returncode != 0:
+            last = (out.stderr.strip().splitlines() or ["(no output)"])[-1]
+            print(f"  {python}: failed ({last})")
+            continue
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        label = f"{python} (Python {result['python']}, GIL {'enabled' if result['gil'] else 'disabled'})"
+        print(f"  {label}")
+        for backend, elapsed in result["times"].items():
+            print(f"    {backend:<8}: {elapsed:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
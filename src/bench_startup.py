@@ -0,0 +1,75 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _noop(_):
+    return None
+
+
+def time_command(cmd, runs):
+    """コマンドを runs 回実行し、実行時間の中央値（秒）を返す"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=SRC_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def time_import(module, runs):
+    """新しいインタプリタで module の import にかかる時間（秒）の中央値を返す"""
+    code = f"import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)"
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip()))
+    return statistics.median(samples)
+
+
+def time_pool_startup(ctx, workers, runs):
+    """ワーカーを起動し、全ワーカーが初期化を終えて1ジョブ処理するまでの時間（秒）の中央値を返す"""
+    import processor
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=processor.init_worker, initargs=(20,)) as executor:
+            list(executor.map(_noop, range(workers)))
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI start-up and worker bootstrap time.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per measurement (median is reported)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="Worker processes to start")
+    args = parser.parse_args()
+
+    sys.path.insert(0, SRC_DIR)
+
+    print(f"Python {sys.version.split()[0]}, {args.runs} runs each (median)")
+    print(f"  cli.py --help         : {time_command([sys.executable, 'cli.py', '--help'], args.runs) * 1000:8.1f} ms")
+    for module in ("effects", "processor", "defcon", "ufo2ft"):
+        print(f"  import {module:<15}: {time_import(module, args.runs) * 1000:8.1f} ms")
+
+    import processor
+    contexts = [("default", multiprocessing.get_context()), ("worker context", processor.get_worker_context())]
+    for method in ("fork", "spawn"):
+        if method in multiprocessing.get_all_start_methods():
+            contexts.append((method, multiprocessing.get_context(method)))
+    for label, ctx in contexts:
+        elapsed = time_pool_startup(ctx, args.workers, args.runs)
+        print(f"  pool x{args.workers} ({label}, {ctx.get_start_method()}): {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
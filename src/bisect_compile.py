@@ -0,0 +1,405 @@
+import io
+import os
+import re
+import argparse
+import datetime
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+# 失敗を再現させる工程（後のものほど前の工程も含む）
+STAGES = ("compile", "subroutinize", "save")
+
+
+def failure_signature(exc):
+    """例外を「型: メッセージの1行目」の文字列にする
+
+    feaLib のエラーは位置（`file:行:桁`）を除き、続く行（足りないグリフ名など）も1行につなげる。
+    """
+    message = str(exc).strip().splitlines()
+    if type(exc).__name__ == "FeatureLibError":
+        text = " ".join(line.strip() for line in message)
+        text = re.sub(r"\s*\(first found at [^)]*\)", "", text)
+        message = [re.sub(r"\S*:\d+:\d+:?\s*", "", text).strip()]
+    return f"{type(exc).__name__}: {message[0] if message else ''}"
+
+
+def same_failure(signature, baseline, match=None):
+    """signature が元の失敗と同じか（match があれば正規表現、なければ例外の型で比較）
+
+    FeatureLibError は参照先の文やグリフを取り除いただけでも起きるため、メッセージまで比べる。
+    """
+    if signature is None:
+        return False
+    if match:
+        return re.search(match, signature) is not None
+    kind = signature.split(":", 1)[0]
+    if kind != baseline.split(":", 1)[0]:
+        return False
+    return kind != "FeatureLibError" or signature == baseline
+
+
+class RawStatement:
+    """解析できなかった features.fea のトップレベルの文またはブロック（生のテキスト）"""
+    def __init__(self, text, line):
+        self.text = text.strip()
+        words = re.findall(r"[^\s{};]+", re.sub(r"#[^\n]*", "", self.text))
+        self.keyword = words[0] if words else ""
+        # ブロックはその名前、それ以外（グリフクラスの定義など）は最初の語で示す
+        if self.keyword in ("feature", "lookup", "table") and len(words) > 1:
+            self.name = f"{self.keyword} {words[1]}"
+        else:
+            self.name = self.keyword
+        self.location = f"features.fea:{line}"
+
+    def asFea(self):
+        return self.text
+
+
+class RawFeatures:
+    """features.fea をトップレベルの文ごとに分割したもの（feaLib で解析できない場合の代わり）"""
+    def __init__(self, text):
+        self.statements = []
+        depth = 0
+        start = 0
+        line, counted = 1, 0
+        i = 0
+        while i < len(text):
+            char = text[i]
+            if char in "#\"":
+                # コメントは行末まで、文字列は閉じる " まで読み飛ばす
+                end = text.find("\n" if char == "#" else '"', i + 1)
+                i = len(text) if end < 0 else end + (char == '"')
+                continue
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth = max(depth - 1, 0)
+            elif char == ";" and depth == 0:
+                line, counted = self._add(text, start, i + 1, line, counted)
+                start = i + 1
+            i += 1
+        if text[start:].strip():
+            self._add(text, start, len(text), line, counted)
+
+    def _add(self, text, start, end, line, counted):
+        """text[start:end] を文として加え、(その文の最初の行番号, 数えた位置) を返す"""
+        body = text[start:end]
+        first = start + len(body) - len(body.lstrip())
+        line += text.count("\n", counted, first)
+        self.statements.append(RawStatement(body, line))
+        return line, first
+
+    def asFea(self):
+        return "\n".join(st.asFea() for st in self.statements)
+
+
+def load_features(font, sanitize=True):
+    """features.fea を AST として読み込む（解析できなければ RawFeatures に分割する）
+
+    参照先のグリフがないなどで解析に失敗する場合も、その失敗自体を絞り込めるようにする。
+    """
+    from layout_cache import parse_features, sanitize_aalt
+    try:
+        doc = parse_features(font)
+    except Exception as e:
+        print(f"[{datetime.datetime.now()}] features.fea does not parse ({failure_signature(e)}); "
+              f"splitting it into top-level statements as text.")
+        return RawFeatures(font.features.text or "")
+    if sanitize:
+        sanitize_aalt(doc)
+    return doc
+
+
+def feature_units(doc):
+    """二分探索の単位にする文の番号（languagesystem とコメント以外のトップレベルの文すべて）
+
+    feature / table ブロックだけでなくグリフクラスや lookup の定義も単位にする。
+    """
+    from fontTools.feaLib import ast
+    units = []
+    for i, st in enumerate(doc.statements):
+        if isinstance(st, RawStatement):
+            if st.keyword != "languagesystem":
+                units.append(i)
+        elif not isinstance(st, (ast.LanguageSystemStatement, ast.Comment)):
+            units.append(i)
+    return units
+
+
+def referenced_glyphs(doc, kept_units, glyph_names):
+    """kept_units の文が名前で参照しているグリフ（glyph_names に含まれるもの）"""
+    text = "\n".join(doc.statements[i].asFea() for i in kept_units)
+    return set(re.findall(r"[A-Za-z_.][\w.\-]*", text)) & set(glyph_names)
+
+
+def features_text(doc, units, kept_units):
+    """kept_units のブロックと、ブロック以外の文だけからなる features.fea を作る"""
+    if kept_units is None:
+        return doc.asFea()
+    dropped = set(units) - set(kept_units)
+    return "\n".join(st.asFea() for i, st in enumerate(doc.statements) if i not in dropped)
+
+
+def subset_font(font, glyph_names, fea_text):
+    """glyph_names（None なら全グリフ）と fea_text だけを持つ defcon.Font を作る
+
+    コンポーネントの参照先と .notdef は自動的に加える。
+    """
+    import defcon
+    if glyph_names is None:
+        names = set(font.keys())
+    else:
+        names = set(glyph_names) | {".notdef"}
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in font:
+                continue
+            for component in font[name].components:
+                if component.baseGlyph not in names:
+                    names.add(component.baseGlyph)
+                    stack.append(component.baseGlyph)
+    names &= set(font.keys())
+
+    sub = defcon.Font()
+    sub.info.setDataFromSerialization(font.info.getDataForSerialization())
+    order = [name for name in font.glyphOrder if name in names]
+    order += sorted(names - set(order))
+    for name in order:
+        sub.insertGlyph(font[name], name=name)
+    sub.glyphOrder = order
+
+    groups = {}
+    for group, members in font.groups.items():
+        kept = [m for m in members if m in names]
+        if kept:
+            groups[group] = kept
+    sub.groups.update(groups)
+    sub.kerning.update({pair: value for pair, value in font.kerning.items()
+                        if all(side in names or side in groups for side in pair)})
+    lib = dict(font.lib)
+    lib.pop("public.glyphOrder", None)
+    if "public.postscriptNames" in lib:
+        lib["public.postscriptNames"] = {k: v for k, v in lib["public.postscriptNames"].items() if k in names}
+    sub.lib.update(lib)
+    sub.features.text = fea_text
+    return sub
+
+
+def _quiet_feature_compiler():
+    """失敗のたびに /tmp に features.fea の写しを書き出さない FeatureCompiler"""
+    from ufo2ft.featureCompiler import FeatureCompiler
+
+    class QuietFeatureCompiler(FeatureCompiler):
+        def _write_temporary_feature_file(self, features):
+            pass
+
+    return QuietFeatureCompiler
+
+
+def compile_font(font, stage):
+    """save_otf と同じ手順で stage までコンパイルする（ファイルには書き出さない）"""
+    import ufo2ft
+    otf = ufo2ft.compileOTF(font, optimizeCFF=False, cffVersion=2, featureCompilerClass=_quiet_feature_compiler())
+    otf["post"].formatType = 3.0
+    if stage in ("subroutinize", "save"):
+        import cffsubr
+        cffsubr.subroutinize(otf, cff_version=2)
+    if stage == "save":
+        otf.save(io.BytesIO())
+
+
+def init_bisect_worker(input_path, stage, sanitize, round_size, effects):
+    """ワーカーの初期化（フォントと features.fea の AST を一度だけ読み込む）"""
+    from processor import FontProcessor, create_effects
+    # ufo2ft / fontTools の進捗ログで出力が埋まらないようにする
+    logging.getLogger("ufo2ft").setLevel(logging.ERROR)
+    logging.getLogger("fontTools").setLevel(logging.ERROR)
+
+    processor = FontProcessor(input_path, round_size=round_size)
+    processor.load()
+    doc = load_features(processor.font, sanitize)
+    state = run_bisect_job
+    state.processor = processor
+    state.doc = doc
+    state.units = feature_units(doc)
+    state.stage = stage
+    state.effects = create_effects(round_size) if effects else None
+
+
+def run_bisect_job(job):
+    """(グリフ名のリスト or None, 残すブロックの番号 or None) でコンパイルし、失敗の署名を返す（成功なら None）"""
+    from processor import apply_effects
+    glyph_names, kept_units = job
+    state = run_bisect_job
+    try:
+        sub = subset_font(state.processor.font, glyph_names, features_text(state.doc, state.units, kept_units))
+        if state.effects is not None:
+            for name in list(sub.keys()):
+                if any(state.processor.is_target_glyph(u) for u in sub[name].unicodes):
+                    data = apply_effects(state.effects, state.processor._extract_glyph_data(sub[name]))
+                    state.processor._apply_glyph_data(sub[name], data)
+        compile_font(sub, state.stage)
+    except Exception as e:
+        return failure_signature(e)
+    return None
+
+
+def ddmin(items, run_jobs, make_job, is_failure, workers, label):
+    """失敗を再現する最小の部分集合を delta debugging で求める
+
+    候補を n 個に分けた各部分を並列にコンパイルし、失敗するものがあればそれに絞る。
+    どれも成功すれば各部分の補集合を並列に試し、それでも絞れなければ分割を細かくする。
+
+    Args:
+        items: 全体（これ自体は失敗することが分かっているもの）
+        run_jobs: ジョブのリストを並列に実行し、結果（失敗の署名）のリストを返す関数
+        make_job: 部分集合からジョブを作る関数
+        is_failure: 署名が元の失敗と同じかを返す関数
+    """
+    items = list(items)
+    n = min(len(items), max(2, workers))
+    round_no = 0
+    while len(items) >= 2:
+        round_no += 1
+        size = -(-len(items) // n)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        print(f"[{datetime.datetime.now()}] {label} round {round_no}: {len(items)} candidates, "
+              f"testing {len(chunks)} subsets...")
+        results = run_jobs([make_job(chunk) for chunk in chunks])
+        failing = [chunk for chunk, sig in zip(chunks, results) if is_failure(sig)]
+        if failing:
+            items = min(failing, key=len)
+            n = min(len(items), max(2, workers))
+            continue
+
+        if len(chunks) > 2:
+            complements = []
+            for chunk in chunks:
+                removed = set(chunk)
+                complements.append([x for x in items if x not in removed])
+            results = run_jobs([make_job(c) for c in complements])
+            failing = [c for c, sig in zip(complements, results) if is_failure(sig)]
+            if failing:
+                items = min(failing, key=len)
+                n = max(min(len(chunks) - 1, len(items)), 2)
+                continue
+
+        if n >= len(items):
+            break
+        n = min(len(items), n * 2)
+    return items
+
+
+def bisect(input_path, stage="save", workers=None, sanitize=True, round_size=20, effects=False, match=None):
+    """コンパイルの失敗を最小のグリフ集合と features.fea の文に絞り込む
+
+    features.fea なしでも失敗すればグリフだけを絞り込む（'features' は空）。そうでなければ
+    トップレベルの文を絞り込む。各候補は残す文が参照するグリフだけでコンパイルし、
+    それで再現しないときに限り全グリフでコンパイルして、残った文が参照しないグリフをさらに絞り込む。
+
+    Returns:
+        Optional[dict]: {'signature', 'glyphs', 'features', 'font', 'doc', 'units'}（失敗が再現しなければ None）
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_bisect_worker,
+                             initargs=(input_path, stage, sanitize, round_size, effects)) as executor:
+        def run_jobs(jobs):
+            return list(executor.map(run_bisect_job, jobs))
+
+        print(f"[{datetime.datetime.now()}] Reproducing the failure on the whole font (stage: {stage})...")
+        baseline, without_features = run_jobs([(None, None), (None, [])])
+        if baseline is None:
+            print(f"[{datetime.datetime.now()}] The whole font compiles; nothing to bisect.")
+            return None
+        print(f"[{datetime.datetime.now()}] Failure: {baseline}")
+
+        def is_failure(signature):
+            return same_failure(signature, baseline, match)
+
+        from processor import FontProcessor
+        processor = FontProcessor(input_path, round_size=round_size)
+        processor.load()
+        doc = load_features(processor.font, sanitize)
+        units = feature_units(doc)
+        glyphs = [name for name in processor.font.glyphOrder if name != ".notdef"]
+
+        if is_failure(without_features):
+            # features.fea の文をすべて除いても失敗する: グリフだけを絞り込む
+            print(f"[{datetime.datetime.now()}] Still fails without features; bisecting glyphs...")
+            glyphs = ddmin(glyphs, run_jobs, lambda chunk: (chunk, []), is_failure, workers, "Glyphs")
+            return {"signature": baseline, "glyphs": glyphs, "features": [], "font": processor.font, "doc": doc, "units": units}
+
+        print(f"[{datetime.datetime.now()}] Passes without features; bisecting {len(units)} statements...")
+        # 候補ごとに全グリフをコンパイルすると遅いので、残す文が参照するグリフだけでコンパイルする
+        def feature_job(chunk):
+            return (sorted(referenced_glyphs(doc, chunk, glyphs)), chunk)
+
+        referenced_only = is_failure(run_jobs([feature_job(units)])[0])
+        if not referenced_only:
+            print(f"[{datetime.datetime.now()}] Does not fail with only the referenced glyphs; "
+                  f"compiling every candidate with the whole font...")
+            feature_job = lambda chunk: (None, chunk)
+        blocks = ddmin(units, run_jobs, feature_job, is_failure, workers, "Features")
+
+        # 残った文が参照するグリフは常に残し、それ以外のグリフを絞り込む
+        required = referenced_glyphs(doc, blocks, glyphs)
+        candidates = [name for name in glyphs if name not in required]
+        if referenced_only:
+            # 参照するグリフだけで失敗することは ddmin で確かめてある
+            candidates = []
+        elif candidates:
+            print(f"[{datetime.datetime.now()}] Bisecting {len(candidates)} glyphs not referenced by "
+                  f"the remaining statements ({len(required)} referenced)...")
+            if is_failure(run_jobs([(sorted(required), blocks)])[0]):
+                candidates = []
+            else:
+                candidates = ddmin(candidates, run_jobs, lambda chunk: (sorted(required) + chunk, blocks),
+                                   is_failure, workers, "Glyphs")
+        glyphs = sorted(required) + candidates
+        return {"signature": baseline, "glyphs": glyphs, "features": blocks, "font": processor.font, "doc": doc, "units": units}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Narrow a font compile failure down to a minimal set of glyphs or feature blocks.")
+    parser.add_argument("--input", required=True, help="Input UFO directory or glyph store (.ntgs)")
+    parser.add_argument("--stage", choices=STAGES, default="save", help="Last build step to run (default: save)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="Number of worker processes (default: half of cores)")
+    parser.add_argument("--no-sanitize", action="store_true", help="Use features.fea as is (the build removes script/language from aalt)")
+    parser.add_argument("--effects", action="store_true", help="Apply the NType effects to the glyphs before compiling")
+    parser.add_argument("--round-size", type=int, default=20, help="Corner rounding size for --effects")
+    parser.add_argument("--match", help="Regex the failure message must match (default: same exception type)")
+    parser.add_argument("--output", default="bisect-repro.ufo", help="Where to save the minimal reproducer UFO (default: bisect-repro.ufo)")
+    args = parser.parse_args()
+
+    # 出力先は上書きするので、以前の再現用 UFO 以外は消さない（長い絞り込みの前に確かめる）
+    if os.path.exists(args.output) and not os.path.exists(os.path.join(args.output, "metainfo.plist")):
+        parser.error(f"--output {args.output} exists and is not a UFO; refusing to overwrite it")
+
+    result = bisect(args.input, stage=args.stage, workers=args.workers, sanitize=not args.no_sanitize,
+                    round_size=args.round_size, effects=args.effects, match=args.match)
+    if result is None:
+        return
+
+    doc, units = result["doc"], result["units"]
+    print(f"\nFailure: {result['signature']}")
+    if result["glyphs"]:
+        print(f"Minimal glyph set ({len(result['glyphs'])}): {', '.join(result['glyphs'][:50])}"
+              + (" ..." if len(result["glyphs"]) > 50 else ""))
+    if result["features"]:
+        print(f"Minimal feature statements ({len(result['features'])}):")
+        for i in result["features"]:
+            st = doc.statements[i]
+            label = st.name if isinstance(st, RawStatement) else f"{type(st).__name__} {getattr(st, 'name', '')}"
+            print(f"    {label} ({st.location})")
+
+    repro = subset_font(result["font"], result["glyphs"], features_text(doc, units, result["features"]))
+    if os.path.exists(args.output):
+        import shutil
+        shutil.rmtree(args.output)
+    repro.save(args.output)
+    print(f"[{datetime.datetime.now()}] Minimal reproducer saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
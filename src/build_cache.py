@@ -0,0 +1,210 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import datetime
+from importlib import metadata as importlib_metadata
+
+# 出力に影響するツール（バージョンをキーに含める）
+TOOL_DISTRIBUTIONS = ("fonttools", "ufo2ft", "defcon", "cffsubr", "numpy")
+# 出力に影響する自前のソース（内容のハッシュをキーに含める）
+SOURCE_FILES = ("effects.py", "processor.py", "layout_cache.py", "metadata.py", "glyph_store.py")
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+# ビルドごとに出力の隣に置かれるファイル
+SIDECAR_SUFFIXES = (".build.json", ".size.json", ".issues.json")
+
+
+def _hash_file(h, path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+
+
+def hash_input(path):
+    """入力（UFO ディレクトリまたは単一ファイル）の内容の SHA-256"""
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(os.path.relpath(full, path).replace(os.sep, "/").encode("utf-8") + b"\0")
+                _hash_file(h, full)
+    else:
+        _hash_file(h, path)
+    return h.hexdigest()
+
+
+def tool_versions():
+    """ツールのバージョンと自前のソースのハッシュ"""
+    versions = {}
+    for dist in TOOL_DISTRIBUTIONS:
+        try:
+            versions[dist] = importlib_metadata.version(dist)
+        except importlib_metadata.PackageNotFoundError:
+            versions[dist] = None
+    for name in SOURCE_FILES:
+        h = hashlib.sha256()
+        _hash_file(h, os.path.join(SRC_DIR, name))
+        versions[name] = h.hexdigest()
+    return versions
+
+
+def build_key(material):
+    """ビルドの入力一式（JSON 化できる辞書）からキャッシュキーを作る"""
+    encoded = json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def artifact_path(output, key, label=None):
+    """キーから決まる出力パス（同じ入力なら常に同じ名前になる）"""
+    base, ext = os.path.splitext(output)
+    if label:
+        base = f"{base}-{label}"
+    return f"{base}_{key[:12]}{ext}"
+
+
+def find_artifact(path, key):
+    """同じキーでビルド済みの成果物があればそのパスを返す"""
+    manifest_path = os.path.splitext(path)[0] + ".build.json"
+    if not (os.path.exists(path) and os.path.exists(manifest_path)):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            if json.load(f).get("key") != key:
+                return None
+    except (OSError, ValueError):
+        return None
+    # prune は更新時刻の古い順に消すため、再利用されたものは新しくしておく
+    os.utime(path)
+    return path
+
+
+def read_manifest(path):
+    """成果物の隣の `.build.json` を読む（なければ None）"""
+    manifest_path = os.path.splitext(path)[0] + ".build.json"
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(path, key, material, timings=None, validation=None):
+    """成果物の隣に `.build.json` を書く
+
+    Args:
+        timings: 工程ごとの所要時間
+        validation: アウトライン検査の結果（検査しなかった場合は None）
+    """
+    manifest_path = os.path.splitext(path)[0] + ".build.json"
+    manifest = {
+        "key": key,
+        "artifact": os.path.basename(path),
+        "built": datetime.datetime.now().astimezone().isoformat(),
+        "inputs": material,
+    }
+    if timings:
+        manifest["timings"] = {step: round(seconds, 3) for step, seconds in timings.items()}
+    if validation is not None:
+        manifest["validation"] = validation
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write("\n")
+    return manifest_path
+
+
+def _tree_size(path):
+    """ファイルまたはディレクトリ以下のファイルの合計サイズ"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def _remove(path, dry_run):
+    print(f"{'Would remove' if dry_run else 'Removing'} {path}{'/' if os.path.isdir(path) else ''}")
+    if not dry_run:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def prune(dist_dir, keep=None, max_bytes=None, dry_run=False, layout_cache_dir=None, diff_dir=None):
+    """dist/ のフォントを新しい順に残し、keep 個または max_bytes を超えた分を削除する
+
+    フォントと一緒に、隣のレポート類・Web 用スライスとプレビュー用の WOFF キャッシュも削除する。
+    max_bytes にはこれらに加えて、レイアウトのキャッシュ（layout_cache_dir の *.pickle）と
+    フォントの比較結果（diff_dir 以下のディレクトリ）も含め、まとめて古い順に削除する。
+    keep はフォントの数だけに適用する。
+
+    Returns:
+        List[str]: 削除した（dry_run なら削除対象の）フォント・キャッシュ・比較結果のパス
+    """
+    layout_cache_dir = layout_cache_dir or os.path.join(dist_dir, ".cache", "layout")
+    diff_dir = diff_dir or os.path.join(dist_dir, "diff")
+
+    # (更新時刻, サイズ, 代表のパス, 一緒に消すパス, フォントか)
+    entries = []
+    for name in os.listdir(dist_dir):
+        path = os.path.join(dist_dir, name)
+        if os.path.isfile(path) and name.lower().endswith((".otf", ".ttf")):
+            stem = os.path.splitext(path)[0]
+            cache_stem = os.path.join(dist_dir, ".cache", os.path.basename(stem))
+            related = [path] + [stem + suffix for suffix in SIDECAR_SUFFIXES]
+            related += [cache_stem + ".woff2", cache_stem + ".woff", stem + ".slices"]
+            related = [p for p in related if os.path.exists(p)]
+            entries.append((os.path.getmtime(path), sum(_tree_size(p) for p in related), path, related, True))
+    if os.path.isdir(layout_cache_dir):
+        for name in os.listdir(layout_cache_dir):
+            path = os.path.join(layout_cache_dir, name)
+            if name.endswith(".pickle"):
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path, [path], False))
+    if os.path.isdir(diff_dir):
+        for name in os.listdir(diff_dir):
+            path = os.path.join(diff_dir, name)
+            if os.path.isdir(path):
+                entries.append((os.path.getmtime(path), _tree_size(path), path, [path], False))
+    entries.sort(reverse=True)
+
+    removed = []
+    total = 0
+    fonts = 0
+    for _, size, path, related, is_font in entries:
+        total += size
+        fonts += is_font
+        if (is_font and keep is not None and fonts > keep) or (max_bytes is not None and total > max_bytes):
+            removed.append(path)
+            for p in related:
+                _remove(p, dry_run)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the dist/ build output bounded.")
+    parser.add_argument("--dist", default="dist", help="Build output directory (default: dist)")
+    parser.add_argument("--keep", type=int, help="Number of most recently built/used fonts to keep")
+    parser.add_argument("--max-size", help="Maximum total size of kept fonts, layout caches and diffs (e.g. 500M, 2G)")
+    parser.add_argument("--layout-cache", help="Layout cache directory to include (default: <dist>/.cache/layout)")
+    parser.add_argument("--diff-dir", help="Font diff directory to include (default: <dist>/diff)")
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would be removed")
+    args = parser.parse_args()
+
+    if args.keep is None and args.max_size is None:
+        parser.error("Specify --keep and/or --max-size")
+    if not os.path.isdir(args.dist):
+        parser.error(f"Not a directory: {args.dist}")
+
+    max_bytes = None
+    if args.max_size:
+        from size_report import parse_size
+        max_bytes = parse_size(args.max_size)
+
+    removed = prune(args.dist, keep=args.keep, max_bytes=max_bytes, dry_run=args.dry_run,
+                    layout_cache_dir=args.layout_cache, diff_dir=args.diff_dir)
+    print(f"{len(removed)} item(s) {'would be ' if args.dry_run else ''}removed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,143 @@
 import argparse
 import time
 import datetime
+import json
 import os
-from processor import FontProcessor
-from metadata import MetadataManager
 
 def get_now():
     return datetime.datetime.now().astimezone()
 
 def main():
     parser = argparse.ArgumentParser(description="Process UFO font with NType-JP style.")
-    parser.add_argument("--input", required=True, help="Input UFO directory")
+    parser.add_argument("--input", required=True, help="Input UFO directory (a built OTF/TTF with --metadata-only)")
     parser.add_argument("--output", help="Output OTF file")
     parser.add_argument("--name", default="NType JP alpha", help="Font family name")
     parser.add_argument("--weight", default="SemiBold", help="Font style name")
+    parser.add_argument("--metadata-only", action="store_true",
+                        help="Copy the built font given as --input with only its name/OS/2/head metadata rewritten for --name/--weight")
     parser.add_argument("--round-size", type=int, default=20, help="Corner rounding size")
     parser.add_argument("--no-parallel", action="store_true", help="Disable parallel processing")
     parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="Number of worker processes (default: half of cores)")
+    parser.add_argument("--format", choices=("otf", "ttf"), default="otf", help="Output CFF2-based OTF or glyf-based TTF (default: otf)")
+    parser.add_argument("--ttf-max-err", type=float, default=1.0, help="Cubic-to-quadratic error tolerance in font units for --format ttf; keep it the same for all weights (default: 1.0)")
+    parser.add_argument("--backend", choices=("process", "thread"), default="process",
+                        help="Parallel backend for the effects: worker processes, or threads sharing the effects (for free-threaded Python 3.13t)")
     parser.add_argument("--no-optimize", action="store_true", help="Disable CFF optimization/compression")
     parser.add_argument("--subset", help="Text to subset (only process and output these characters)")
     parser.add_argument("--subset-file", help="Path to a text file containing characters to subset")
     parser.add_argument("--subset-glyphs", help="Comma separated glyph names to subset")
+    parser.add_argument("--simplify", action="store_true", help="Remove redundant outline points after the effects")
+    parser.add_argument("--simplify-tolerance", type=float, default=0.5, help="Max distance from a straight line for removed points (default: 0.5)")
+    parser.add_argument("--layout-cache", default="dist/.cache/layout", help="Directory for cached GSUB/GPOS/GDEF tables")
+    parser.add_argument("--no-layout-cache", action="store_true", help="Always recompile layout features")
+    parser.add_argument("--no-size-report", action="store_true", help="Skip the size breakdown report after the build")
+    parser.add_argument("--compare-report", help="Previous build's .size.json to diff the size report against")
+    parser.add_argument("--size-budget", help="Fail the build when the output exceeds this size (e.g. 12M, 800K)")
+    parser.add_argument("--sweep", action="append", metavar="EFFECT.PARAM=V1,V2,...",
+                        help="Build one font per parameter combination (repeatable, e.g. HorizontalBolder.adjust=6,9,12)")
+    parser.add_argument("--validate", action="store_true", help="Check the processed outlines in the workers and fail before compiling if they are broken")
+    parser.add_argument("--validate-warn-only", action="store_true", help="Report outline issues but build anyway")
+    parser.add_argument("--listen", metavar="HOST:PORT", help="Distribute glyph processing to workers connecting to this address (see distributed.py worker)")
+    parser.add_argument("--authkey", help="Shared secret for distributed workers (default: $NTYPE_DIST_AUTHKEY)")
+    parser.add_argument("--local-workers", type=int, default=0, help="Worker processes to start on this host in distributed mode")
+    parser.add_argument("--shard-size", type=int, default=200, help="Glyphs per shard in distributed mode (default: 200)")
+    parser.add_argument("--no-build-cache", action="store_true", help="Rebuild even if an identical build already exists in the output location")
+    parser.add_argument("--web-slices", action="store_true", help="Also split the output into unicode-range WOFF2 slices with @font-face CSS")
+    parser.add_argument("--slice-frequency-file", help="Characters for the first web slice (default: subset.txt)")
+    parser.add_argument("--slice-size", type=int, default=500, help="Maximum characters per web slice (default: 500)")
     
     args = parser.parse_args()
 
-    subset_glyphs = []
-    if args.subset_glyphs:
-        subset_glyphs.extend(args.subset_glyphs.split(","))
+    # --help やオプションのエラーを素早く返すため、重いモジュールは解析後に読み込む
+    from processor import FontProcessor
+    from metadata import MetadataManager
+    from sweep import expand_sweep_grid
+    from size_report import write_report, parse_size, SizeBudgetExceeded
+    from build_cache import hash_input, tool_versions, build_key, artifact_path, find_artifact, read_manifest, write_manifest
 
-    processor = FontProcessor(args.input, round_size=args.round_size)
-    processor.load()
+    layout_cache_dir = None if args.no_layout_cache else args.layout_cache
+
+    size_budget = None
+    if args.size_budget:
+        try:
+            size_budget = parse_size(args.size_budget)
+        except ValueError:
+            parser.error(f"Invalid --size-budget: {args.size_budget}")
+    over_budget = []
+
+    def report_size(output):
+        if args.no_size_report and size_budget is None:
+            return
+        try:
+            write_report(output, baseline_path=args.compare_report, size_budget=size_budget)
+        except SizeBudgetExceeded as e:
+            print(f"Error: {e}")
+            over_budget.append(output)
+
+    def slice_output(output):
+        if not args.web_slices:
+            return
+        from web_slices import write_slices, read_frequency_file, DEFAULT_FREQUENCY_FILE
+        frequency_text = read_frequency_file(args.slice_frequency_file or DEFAULT_FREQUENCY_FILE)
+        write_slices(output, frequency_text=frequency_text, slice_size=args.slice_size,
+                     max_workers=1 if args.no_parallel else args.workers)
+
+    metadata = {
+        "name": args.name,
+        "weight": args.weight,
+        "designer": "Nothing Japanese Font Project",
+        "vendor_id": "NTYP",
+    }
+
+    if args.metadata_only:
+        if args.sweep or args.listen:
+            parser.error("--metadata-only cannot be combined with --sweep or --listen")
+        # エフェクトもコンパイルも行わず、ビルド済みのフォントのメタデータだけを書き換える
+        patch_material = {"patched_from": hash_input(args.input), "metadata": metadata, "tools": tool_versions()}
+        key = build_key(patch_material)
+        output = os.path.splitext(args.output or f"dist/NTypeJP-{args.weight}")[0] + os.path.splitext(args.input)[1]
+        output = artifact_path(output, key)
+        if not args.no_build_cache and find_artifact(output, key):
+            print(f"[{datetime.datetime.now()}] Up to date: {output}")
+            if size_budget is not None:
+                report_size(output)
+        else:
+            out_dir = os.path.dirname(output)
+            if out_dir:
+                os.makedirs(out_dir, exist_ok=True)
+            start = time.perf_counter()
+            MetadataManager.patch_font(args.input, output, **metadata)
+            elapsed = time.perf_counter() - start
+            write_manifest(output, key, patch_material, timings={"metadata": elapsed})
+            print(f"[{datetime.datetime.now()}] Saved to {output} (metadata only, {elapsed:.2f}s)")
+            report_size(output)
+        slice_output(output)
+        if over_budget:
+            print(f"Build failed: {len(over_budget)} font(s) over the size budget.")
+            raise SystemExit(1)
+        return
+
+    variants = None
+    distributed_address = None
+    local_only = False
+    if args.listen:
+        from distributed import parse_address, get_authkey
+        if args.sweep:
+            parser.error("--listen cannot be combined with --sweep")
+        distributed_address = parse_address(args.listen)
+        authkey = get_authkey(args.authkey)
+        if not authkey:
+            if not args.local_workers:
+                parser.error("Specify --authkey or set NTYPE_DIST_AUTHKEY for remote workers")
+            # ローカルのワーカーだけなら使い捨ての鍵でよい
+            authkey = os.urandom(32)
+            local_only = True
+
+    if args.sweep:
+        try:
+            variants = expand_sweep_grid(args.sweep)
+        except ValueError as e:
+            parser.error(str(e))
 
     subset_text = args.subset or ""
     
@@ -40,6 +148,88 @@ def main():
         else:
             print(f"Warning: Subset file not found: {args.subset_file}")
 
+    processor = FontProcessor(
+        args.input,
+        round_size=args.round_size,
+        simplify_tolerance=args.simplify_tolerance if args.simplify else None,
+        validate=args.validate or args.validate_warn_only
+    )
+
+    # 出力に影響する入力をすべてハッシュし、出力ファイル名に使う
+    # （同じキーの成果物が既にあれば、フォントを読み込まずにそれを返す）
+    # 検査はアウトラインを変えないのでキーに含めず、結果を .build.json に記録する
+    print(f"[{datetime.datetime.now()}] Hashing build inputs...")
+    keyed_params = {name: params for name, params in processor.effect_params.items() if name != "OutlineValidator"}
+    material = {
+        "input": hash_input(args.input),
+        "round_size": args.round_size,
+        "effect_params": keyed_params,
+        "subset": {"text": subset_text, "glyphs": args.subset_glyphs},
+        "metadata": metadata,
+        "optimize_cff": not args.no_optimize,
+        "tools": tool_versions(),
+    }
+    if args.format == "ttf":
+        material["format"] = {"flavor": "ttf", "max_err": args.ttf_max_err}
+    output_base = args.output or f"dist/NTypeJP-{args.weight}.otf"
+    output_base = os.path.splitext(output_base)[0] + f".{args.format}"
+
+    builds = []
+    for label, tag, params in (variants or [(None, None, {})]):
+        variant_material = material
+        if label:
+            variant_material = {
+                **material,
+                "effect_params": {**keyed_params, **params},
+                "metadata": {**material["metadata"], "weight": f"{args.weight} {tag}"},
+            }
+        key = build_key(variant_material)
+        builds.append((label, params, key, variant_material, artifact_path(output_base, key, label)))
+
+    invalid = []
+
+    def cached_validation_ok(output):
+        """--validate のとき、キャッシュ済みの成果物の検査結果を確かめる（未検査なら作り直す）"""
+        if not args.validate or args.validate_warn_only:
+            return True
+        validation = (read_manifest(output) or {}).get("validation")
+        if validation is None:
+            print(f"[{datetime.datetime.now()}] {output} was built without validation, rebuilding to check it.")
+            return False
+        if validation["error_glyphs"]:
+            print(f"Error: {output} was built with {validation['error_glyphs']} glyph(s) with broken outlines "
+                  f"(see {validation['issues_file']})")
+            invalid.append(output)
+        return True
+
+    pending = []
+    for build in builds:
+        output = build[4]
+        if not args.no_build_cache and find_artifact(output, build[2]) and cached_validation_ok(output):
+            if output in invalid:
+                continue
+            print(f"[{datetime.datetime.now()}] Up to date: {output}")
+            if size_budget is not None:
+                report_size(output)
+            slice_output(output)
+        else:
+            pending.append(build)
+
+    if not pending:
+        if invalid:
+            print(f"Build failed: {len(invalid)} font(s) with broken outlines.")
+        if over_budget:
+            print(f"Build failed: {len(over_budget)} font(s) over the size budget.")
+        if invalid or over_budget:
+            raise SystemExit(1)
+        return
+
+    subset_glyphs = []
+    if args.subset_glyphs:
+        subset_glyphs.extend(args.subset_glyphs.split(","))
+
+    processor.load()
+
     if subset_text:
         for char in subset_text:
             uni = ord(char)
@@ -57,24 +247,93 @@ def main():
     )
 
     start_time = time.time()
-    processor.process(use_parallel=not args.no_parallel, max_workers=args.workers, subset_glyphs=subset_glyphs)
 
-    now = get_now()
-    now_str = now.strftime('%Y%m%d_%H%M%S')
-    if not args.output:
-        args.output = f"dist/NTypeJP-{args.weight}-{now_str}.otf"
-    else:
-        base, ext = os.path.splitext(args.output)
-        args.output = f"{base}_{now_str}{ext}"
-    
-    out_dir = os.path.dirname(args.output)
-    if out_dir:
-        os.makedirs(out_dir, exist_ok=True)
+    def validation_result(output):
+        """.build.json に記録する検査の結果（検査しなかった場合は None）"""
+        if "OutlineValidator" not in processor.effect_params:
+            return None
+        return {
+            "error_glyphs": len(processor.validation_errors()),
+            "issue_glyphs": len(processor.issues),
+            "issues_file": os.path.basename(os.path.splitext(output)[0] + ".issues.json") if processor.issues else None,
+        }
+
+    def check_outlines(output):
+        """検査の結果を `<出力>.issues.json` に保存し、コンパイルしてよいかを返す"""
+        issues_path = os.path.splitext(output)[0] + ".issues.json"
+        if not processor.issues:
+            # 前回のビルドの結果が残らないようにする
+            if os.path.exists(issues_path):
+                os.remove(issues_path)
+            return True
+        with open(issues_path, "w", encoding="utf-8") as f:
+            json.dump(processor.issues, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+        print(f"[{datetime.datetime.now()}] Outline issues saved to {issues_path}")
+        errors = processor.validation_errors()
+        if errors and not args.validate_warn_only:
+            print(f"Error: {len(errors)} glyph(s) with broken outlines, skipping compile of {output}")
+            invalid.append(output)
+            return False
+        return True
+
+    def save(output, key, variant_material):
+        out_dir = os.path.dirname(output)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        if not check_outlines(output):
+            return
+        if args.format == "ttf":
+            processor.convert_to_quadratic(args.ttf_max_err, use_parallel=not args.no_parallel,
+                                           max_workers=args.workers, subset_glyphs=subset_glyphs)
+            processor.save_ttf(output, optimize=not args.no_optimize, subset_glyphs=subset_glyphs,
+                               layout_cache_dir=layout_cache_dir)
+        else:
+            processor.save_otf(output, optimize_cff=not args.no_optimize, subset_glyphs=subset_glyphs,
+                               layout_cache_dir=layout_cache_dir)
+        write_manifest(output, key, variant_material, timings=processor.timings, validation=validation_result(output))
+        report_size(output)
+        slice_output(output)
 
-    processor.save_otf(args.output, optimize_cff=not args.no_optimize, subset_glyphs=subset_glyphs)
+    if variants:
+        print(f"Sweep mode: {len(pending)} of {len(variants)} combinations to build.")
+        sweep_iter = processor.process_sweep(
+            [params for _, params, _, _, _ in pending],
+            use_parallel=not args.no_parallel,
+            max_workers=args.workers,
+            subset_glyphs=subset_glyphs
+        )
+        for index in sweep_iter:
+            label, _, key, variant_material, output = pending[index]
+            print(f"[{datetime.datetime.now()}] Style \"{variant_material['metadata']['weight']}\" is {label}")
+            MetadataManager.update(
+                processor.font,
+                args.name,
+                variant_material["metadata"]["weight"],
+                "Nothing Japanese Font Project",
+                "NTYP"
+            )
+            save(output, key, variant_material)
+    else:
+        if distributed_address:
+            processor.process_distributed(distributed_address, authkey, subset_glyphs=subset_glyphs,
+                                          shard_size=args.shard_size, local_workers=args.local_workers,
+                                          local_only=local_only)
+        else:
+            processor.process(use_parallel=not args.no_parallel, max_workers=args.workers, subset_glyphs=subset_glyphs,
+                              backend=args.backend)
+        _, _, key, variant_material, output = pending[0]
+        save(output, key, variant_material)
     
     duration = time.time() - start_time
     print(f"[{get_now().strftime('%Y-%m-%d %H:%M:%S %Z')}] Total duration: {duration:.2f} seconds.")
 
+    if invalid:
+        print(f"Build failed: {len(invalid)} font(s) with broken outlines.")
+    if over_budget:
+        print(f"Build failed: {len(over_budget)} font(s) over the size budget.")
+    if invalid or over_budget:
+        raise SystemExit(1)
+
 if __name__ == "__main__":
     main()
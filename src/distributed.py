@@ -0,0 +1,259 @@
+import os
+import time
+import queue
+import argparse
+import datetime
+import threading
+from multiprocessing.connection import Listener, Client, AuthenticationError
+
+# 共有鍵を指定しなかった場合に参照する環境変数
+AUTHKEY_ENV = "NTYPE_DIST_AUTHKEY"
+
+
+def parse_address(text, default_host="127.0.0.1"):
+    """'host:port' または 'port' を (host, port) にする"""
+    host, _, port = str(text).rpartition(":")
+    return (host or default_host, int(port))
+
+
+def get_authkey(value=None):
+    """共有鍵（--authkey または環境変数 NTYPE_DIST_AUTHKEY）を bytes で返す"""
+    value = value or os.environ.get(AUTHKEY_ENV)
+    return value.encode("utf-8") if value else None
+
+
+class WorkerLost(Exception):
+    """ワーカーとの接続が切れた、または応答が時間内に返らなかった"""
+
+
+class Coordinator:
+    """グリフのシャードを TCP 経由でワーカーに配るコーディネーター
+
+    ワーカーは multiprocessing.connection で接続し（共有鍵による HMAC 認証、
+    メッセージは pickle）、次のメッセージをやり取りする。
+
+        coordinator -> worker: ("init", round_size, effect_params)
+        coordinator -> worker: ("shard", shard_id, [glyph_data, ...])
+        worker -> coordinator: ("result", shard_id, [glyph_data, ...])
+                               ("error", shard_id, traceback_text)
+        coordinator -> worker: ("stop",)
+
+    接続ごとにスレッドを立て、待ち行列からシャードを1つずつ渡す。接続が切れたり
+    shard_timeout 以内に結果が返らなければ、そのシャードを待ち行列に戻して
+    他のワーカーに渡し直す（max_retries 回まで）。
+    """
+    def __init__(self, address, authkey, init_args, shard_timeout=300, max_retries=3):
+        self.listener = Listener(address, authkey=authkey)
+        self.authkey = authkey
+        self.init_args = init_args
+        self.shard_timeout = shard_timeout
+        self.max_retries = max_retries
+        self._stop = threading.Event()
+        self._pending = queue.Queue()
+        self._events = queue.Queue()
+        self._shards = []
+        self._connections = 0
+        self._lock = threading.Lock()
+        self._acceptor = threading.Thread(target=self._accept_loop, daemon=True)
+        self._acceptor.start()
+
+    @property
+    def address(self):
+        return self.listener.address
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError) as e:
+                if self._stop.is_set():
+                    return
+                print(f"[{datetime.datetime.now()}] Rejected worker connection: {e!r}")
+                continue
+            if self._stop.is_set():
+                conn.close()
+                return
+            peer = getattr(self.listener, "last_accepted", None)
+            threading.Thread(target=self._serve, args=(conn, peer), daemon=True).start()
+
+    def _serve(self, conn, peer):
+        with self._lock:
+            self._connections += 1
+        print(f"[{datetime.datetime.now()}] Worker connected: {peer}")
+        try:
+            conn.send(("init",) + tuple(self.init_args))
+            while not self._stop.is_set():
+                try:
+                    shard_id = self._pending.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                try:
+                    conn.send(("shard", shard_id, self._shards[shard_id]))
+                    if not conn.poll(self.shard_timeout):
+                        raise WorkerLost(f"no result within {self.shard_timeout} seconds")
+                    kind, result_id, payload = conn.recv()
+                except (OSError, EOFError, WorkerLost) as e:
+                    self._events.put(("lost", shard_id, f"{peer}: {e!r}"))
+                    return
+                self._events.put((kind, result_id, payload))
+            conn.send(("stop",))
+        except (OSError, EOFError):
+            pass
+        finally:
+            conn.close()
+            with self._lock:
+                self._connections -= 1
+            print(f"[{datetime.datetime.now()}] Worker disconnected: {peer}")
+
+    def map(self, shards, wait_message_interval=30, local_procs=None):
+        """シャードを配り、完了したものから (shard_id, 結果のリスト) を yield する（順不同）
+
+        接続中のワーカーがいない状態が shard_timeout 秒続いたら RuntimeError を送出する。
+        local_procs を渡した場合（リモートのワーカーが接続できないとき）は、
+        それらがすべて終了した時点で送出する。
+        """
+        self._shards = shards
+        attempts = [0] * len(shards)
+        done = set()
+        for shard_id in range(len(shards)):
+            self._pending.put(shard_id)
+
+        last_event = time.monotonic()
+        idle_since = time.monotonic()
+        while len(done) < len(shards):
+            try:
+                kind, shard_id, payload = self._events.get(timeout=1.0)
+            except queue.Empty:
+                if self._connections:
+                    idle_since = None
+                else:
+                    idle_since = idle_since or time.monotonic()
+                    left = len(shards) - len(done)
+                    if local_procs is not None and not any(proc.is_alive() for proc in local_procs):
+                        raise RuntimeError(f"All local workers exited with {left} shards left")
+                    if time.monotonic() - idle_since > self.shard_timeout:
+                        raise RuntimeError(f"No workers connected for {self.shard_timeout} seconds "
+                                           f"with {left} shards left")
+                if time.monotonic() - last_event > wait_message_interval:
+                    print(f"[{datetime.datetime.now()}] Waiting for workers on {self.address} "
+                          f"({self._connections} connected, {len(shards) - len(done)} shards left)...")
+                    last_event = time.monotonic()
+                continue
+            last_event = time.monotonic()
+
+            if kind == "result":
+                # 時間切れで配り直したシャードの結果が二重に届いた場合は無視する
+                if shard_id not in done:
+                    done.add(shard_id)
+                    yield shard_id, payload
+                continue
+
+            attempts[shard_id] += 1
+            print(f"[{datetime.datetime.now()}] Shard {shard_id} failed (attempt {attempts[shard_id]}): "
+                  f"{payload.strip().splitlines()[-1] if kind == 'error' else payload}")
+            if attempts[shard_id] > self.max_retries:
+                raise RuntimeError(f"Shard {shard_id} failed {attempts[shard_id]} times, giving up")
+            self._pending.put(shard_id)
+
+    def close(self):
+        self._stop.set()
+        # accept() で待っているスレッドを起こす
+        try:
+            host, port = self.address
+            Client(("127.0.0.1" if host in ("0.0.0.0", "") else host, port), authkey=self.authkey).close()
+        except (OSError, EOFError, AuthenticationError):
+            pass
+        self.listener.close()
+
+
+def run_worker(address, authkey, exit_after=None, connect_timeout=60):
+    """コーディネーターに接続し、受け取ったシャードにエフェクトを適用して返す
+
+    Args:
+        address: コーディネーターの (host, port)
+        authkey: 共有鍵
+        exit_after: この数のシャードを処理したら結果を返さずに切断する（ワーカー喪失の試験用）
+        connect_timeout: コーディネーターが起動するまで接続を再試行する秒数
+    """
+    import traceback
+    from processor import init_worker, process_glyph_worker
+
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+    processed = 0
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return processed
+            if message[0] == "init":
+                init_worker(*message[1:])
+            elif message[0] == "stop":
+                return processed
+            elif message[0] == "shard":
+                _, shard_id, shard = message
+                if exit_after is not None and processed >= exit_after:
+                    return processed
+                try:
+                    conn.send(("result", shard_id, [process_glyph_worker(data) for data in shard]))
+                except Exception:
+                    conn.send(("error", shard_id, traceback.format_exc()))
+                processed += 1
+
+
+def start_local_workers(address, authkey, count, exit_after=None):
+    """リモートノードの代わりにローカルでワーカープロセスを起動する"""
+    from processor import get_worker_context
+    host, port = address
+    address = ("127.0.0.1" if host in ("0.0.0.0", "") else host, port)
+    ctx = get_worker_context()
+    procs = []
+    for _ in range(count):
+        proc = ctx.Process(target=run_worker, args=(address, authkey, exit_after), daemon=True)
+        proc.start()
+        procs.append(proc)
+    return procs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run distributed glyph processing workers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="Connect to a coordinator (cli.py --listen) and process glyph shards")
+    worker.add_argument("--connect", required=True, help="Coordinator address (HOST:PORT)")
+    worker.add_argument("--authkey", help=f"Shared secret (default: ${AUTHKEY_ENV})")
+    worker.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="Worker processes on this host (default: half of cores)")
+    worker.add_argument("--connect-timeout", type=float, default=60, help="Seconds to keep retrying the connection (default: 60)")
+    worker.add_argument("--exit-after", type=int, help="Drop the connection after this many shards (for testing retries)")
+    args = parser.parse_args()
+
+    authkey = get_authkey(args.authkey)
+    if not authkey:
+        parser.error(f"Specify --authkey or set {AUTHKEY_ENV}")
+    address = parse_address(args.connect)
+
+    print(f"[{datetime.datetime.now()}] Starting {args.processes} worker(s) for {address[0]}:{address[1]}...")
+    from processor import get_worker_context
+    ctx = get_worker_context()
+    procs = [ctx.Process(target=run_worker, args=(address, authkey, args.exit_after, args.connect_timeout))
+             for _ in range(args.processes)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    failed = sum(1 for proc in procs if proc.exitcode)
+    if failed:
+        print(f"{failed} worker(s) exited with errors.")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import numpy as np
-from matplotlib.path import Path
 from typing import List, Dict, Any, Optional, Tuple
 
 class GlyphEffect:
@@ -456,3 +455,91 @@ class Normalizer(GlyphEffect):
                 if p.get('segmentType') is None and p_next.get('segmentType') == "line":
                     p_next['segmentType'] = "curve"
         return glyph_data
+
+
+class OutlineSimplifier(GlyphEffect):
+    """アウトラインの簡略化
+
+    エフェクト適用後に残る長さゼロの線分（重複したオンカーブ点）と、
+    直線上に並んだ line 点を取り除き、CFF2 のチャーストリングを小さくする。
+    曲線の制御点には触れないため、許容誤差内で見た目は変わらない。
+    """
+    def __init__(self, tolerance: float = 0.5):
+        """
+        Args:
+            tolerance: 直線からの距離がこれ以下の line 点を除去する（ユニット単位）
+        """
+        self.tolerance = tolerance
+
+    def apply(self, glyph_data: Dict[str, Any]) -> Dict[str, Any]:
+        """各輪郭の冗長な点を除去し、前後の点数とチャーストリング長を glyph_data['simplify_stats'] に記録する"""
+        points_before = sum(len(c['points']) for c in glyph_data['contours'])
+        bytes_before = self._charstring_size(glyph_data)
+
+        for contour in glyph_data['contours']:
+            contour['points'] = self._simplify_contour(contour['points'])
+
+        points_after = sum(len(c['points']) for c in glyph_data['contours'])
+        bytes_after = self._charstring_size(glyph_data)
+        glyph_data['simplify_stats'] = (points_before, points_after, bytes_before, bytes_after)
+        return glyph_data
+
+    def _simplify_contour(self, points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pts = list(points)
+        changed = True
+        while changed and len(pts) > 3:
+            changed = False
+            n = len(pts)
+            for i in range(n):
+                p = pts[i]
+                if p.get('segmentType') != 'line':
+                    continue
+                p_prev = pts[(i - 1) % n]
+                if p_prev.get('segmentType') is None:
+                    continue
+                # 長さゼロの線分（直前のオンカーブ点と同じ座標）
+                if p['x'] == p_prev['x'] and p['y'] == p_prev['y']:
+                    del pts[i]
+                    changed = True
+                    break
+                p_next = pts[(i + 1) % n]
+                if p_next.get('segmentType') != 'line':
+                    continue
+                if self._is_collinear(p_prev, p, p_next):
+                    del pts[i]
+                    changed = True
+                    break
+        return pts
+
+    def _is_collinear(self, a: Dict[str, Any], p: Dict[str, Any], b: Dict[str, Any]) -> bool:
+        """p が線分 a-b 上（許容誤差内）にあるか判定する"""
+        dx = b['x'] - a['x']
+        dy = b['y'] - a['y']
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            return False
+        t = ((p['x'] - a['x']) * dx + (p['y'] - a['y']) * dy) / length_sq
+        if t <= 0 or t >= 1:
+            return False
+        dist = abs((p['x'] - a['x']) * dy - (p['y'] - a['y']) * dx) / np.sqrt(length_sq)
+        return dist <= self.tolerance
+
+    @staticmethod
+    def _charstring_size(glyph_data: Dict[str, Any]) -> int:
+        """サブルーチン化前の CFF2 チャーストリングのバイト数を求める
+
+        save_otf と同じく optimizeCFF=False 相当（演算子の最適化なし）で見積もる。
+        """
+        from fontTools.pens.pointPen import PointToSegmentPen
+        from fontTools.pens.t2CharStringPen import T2CharStringPen
+
+        pen = T2CharStringPen(None, None, CFF2=True)
+        point_pen = PointToSegmentPen(pen)
+        for contour in glyph_data['contours']:
+            point_pen.beginPath()
+            for p in contour['points']:
+                point_pen.addPoint((p['x'], p['y']), segmentType=p.get('segmentType'), smooth=p.get('smooth', False))
+            point_pen.endPath()
+        charstring = pen.getCharString(optimize=False)
+        charstring.compile()
+        return len(charstring.bytecode)
@@ -0,0 +1,402 @@
+import os
+import re
+import html
+import json
+import zlib
+import struct
+import hashlib
+import argparse
+import datetime
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from fontTools.pens.basePen import BasePen
+from fontTools.pens.recordingPen import DecomposingRecordingPen, replayRecording
+
+DEFAULT_DIFF_DIR = os.path.join("dist", "diff")
+
+
+class _UFOGlyph:
+    """ufoLib の GlyphSet のグリフを draw できるようにするラッパー"""
+    def __init__(self, glyph_set, name):
+        self.glyph_set = glyph_set
+        self.name = name
+        self.width = 0
+
+    def draw(self, pen):
+        from fontTools.pens.pointPen import PointToSegmentPen
+        self.glyph_set.readGlyph(self.name, self, PointToSegmentPen(pen))
+
+
+class _UFOGlyphSet(dict):
+    """グリフ名から _UFOGlyph を返す（DecomposingPen がコンポーネントの参照先を引くのに使う）"""
+    def __init__(self, glyph_set):
+        super().__init__()
+        self.glyph_set = glyph_set
+
+    def __missing__(self, name):
+        if name not in self.glyph_set:
+            raise KeyError(name)
+        return _UFOGlyph(self.glyph_set, name)
+
+    def __contains__(self, name):
+        return name in self.glyph_set
+
+
+class GlyphSource:
+    """比較するフォント（ビルド済みの OTF/TTF または UFO）からグリフを読み出すクラス
+
+    グリフは「U+XXXX」（Unicode を持つもの）またはグリフ名をキーにして対応付ける。
+    ビルド済みのフォントと UFO ではグリフ名が異なるため、Unicode を優先する。
+    """
+    def __init__(self, path, names=None):
+        """
+        Args:
+            path: OTF/TTF または UFO ディレクトリ
+            names: 既に求めたキーとグリフ名の対応（ワーカーで全グリフの Unicode を読み直さないため）
+        """
+        self.path = path
+        descender = None
+        if os.path.isdir(path):
+            from fontTools.ufoLib import UFOReader
+            reader = UFOReader(path, validate=False)
+            info = SimpleNamespace()
+            reader.readInfo(info)
+            self.units_per_em = getattr(info, "unitsPerEm", None) or 1000
+            descender = getattr(info, "descender", None)
+            ufo_glyphs = reader.getGlyphSet(validateRead=False)
+            self.glyph_set = _UFOGlyphSet(ufo_glyphs)
+            if names is None:
+                unicodes = ufo_glyphs.getUnicodes()
+        else:
+            from fontTools.ttLib import TTFont
+            font = TTFont(path, lazy=True)
+            self.units_per_em = font["head"].unitsPerEm
+            if "OS/2" in font:
+                descender = font["OS/2"].sTypoDescender
+            self.glyph_set = font.getGlyphSet()
+            if names is None:
+                unicodes = {name: [] for name in font.getGlyphOrder()}
+                for cp, name in font.getBestCmap().items():
+                    unicodes[name].append(cp)
+        self.descender = descender if descender is not None else -0.12 * self.units_per_em
+
+        if names is None:
+            names = {f"U+{min(cps):04X}" if cps else name: name for name, cps in unicodes.items()}
+        self.names = names
+
+    def record(self, key):
+        """キーのグリフの (送り幅, 分解済みのペン操作の列) を返す"""
+        glyph = self.glyph_set[self.names[key]]
+        pen = DecomposingRecordingPen(self.glyph_set)
+        glyph.draw(pen)
+        return glyph.width, pen.value
+
+
+def outline_hash(width, value):
+    """送り幅とアウトラインのハッシュ（同じなら描画を省略する）"""
+    return hashlib.blake2b(repr((width, value)).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _FlattenPen(BasePen):
+    """曲線を steps 分割の折れ線にして、閉じた輪郭ごとの点の列を集めるペン"""
+    def __init__(self, steps=8):
+        super().__init__(None)
+        self.ts = [i / steps for i in range(1, steps + 1)]
+        self.contours = []
+        self.current = []
+
+    def _moveTo(self, pt):
+        self._flush()
+        self.current = [pt]
+
+    def _lineTo(self, pt):
+        self.current.append(pt)
+
+    def _curveToOne(self, p1, p2, p3):
+        (x0, y0) = self._getCurrentPoint()
+        for t in self.ts:
+            mt = 1 - t
+            a, b, c, d = mt * mt * mt, 3 * mt * mt * t, 3 * mt * t * t, t * t * t
+            self.current.append((a * x0 + b * p1[0] + c * p2[0] + d * p3[0],
+                                 a * y0 + b * p1[1] + c * p2[1] + d * p3[1]))
+
+    def _qCurveToOne(self, p1, p2):
+        (x0, y0) = self._getCurrentPoint()
+        for t in self.ts:
+            mt = 1 - t
+            a, b, c = mt * mt, 2 * mt * t, t * t
+            self.current.append((a * x0 + b * p1[0] + c * p2[0], a * y0 + b * p1[1] + c * p2[1]))
+
+    def _closePath(self):
+        self._flush()
+
+    _endPath = _closePath
+
+    def _flush(self):
+        if len(self.current) > 2:
+            self.contours.append(self.current)
+        self.current = []
+
+
+def rasterize(value, units_per_em, descender, size=48, supersample=4):
+    """アウトラインを size x size ピクセルの em ボックスに描き、各ピクセルの被覆率（0〜1）を返す
+
+    各ピクセルを supersample x supersample 点で標本化し、非ゼロ回転数規則で内外を判定する。
+    """
+    n = size * supersample
+    pen = _FlattenPen()
+    replayRecording(value, pen)
+    pen._flush()
+    if not pen.contours:
+        return np.zeros((size, size))
+    scale = n / units_per_em
+    top = descender + units_per_em
+    # 輪郭ごとに、各点の次の点（最後は最初に戻る）を辺の終点にする
+    lengths = np.array([len(c) for c in pen.contours])
+    a = np.array([pt for c in pen.contours for pt in c], dtype=float)
+    nxt = np.arange(1, len(a) + 1)
+    ends = np.cumsum(lengths)
+    nxt[ends - 1] = ends - lengths
+    b = a[nxt]
+    x0, y0 = a[:, 0] * scale, (top - a[:, 1]) * scale
+    x1, y1 = b[:, 0] * scale, (top - b[:, 1]) * scale
+
+    # 各標本の行（y = r + 0.5）と交わる辺の x 座標と向き
+    rows = np.arange(n) + 0.5
+    lo, hi = np.minimum(y0, y1), np.maximum(y0, y1)
+    r, e = np.nonzero((lo[None, :] <= rows[:, None]) & (rows[:, None] < hi[None, :]))
+    t = (rows[r] - y0[e]) / (y1[e] - y0[e])
+    x = x0[e] + t * (x1[e] - x0[e])
+    direction = np.where(y1[e] > y0[e], 1, -1)
+    # 交点より右の標本（x = c + 0.5 > 交点）に向きを足し込み、行ごとの累積和を回転数にする
+    col = np.clip(np.ceil(x - 0.5), 0, n).astype(np.int64)
+    winding = np.zeros((n, n + 1), dtype=np.int16)
+    np.add.at(winding, (r, col), direction)
+    inside = np.cumsum(winding, axis=1, dtype=np.int16)[:, :n] != 0
+    covered = inside.reshape(size, supersample, size, supersample).sum(axis=(1, 3), dtype=np.int16)
+    return covered / (supersample * supersample)
+
+
+def png_bytes(rgb):
+    """(高さ, 幅, 3) の uint8 配列を PNG にする"""
+    h, w, _ = rgb.shape
+    raw = np.hstack([np.zeros((h, 1), dtype=np.uint8), rgb.reshape(h, w * 3)]).tobytes()
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b""))
+
+
+def contact_image(a, b):
+    """A ｜ 重ね合わせ ｜ B を横に並べた画像（重ね合わせは A のみ赤、B のみ青、共通は黒）"""
+    def grey(c):
+        return np.repeat((1 - c)[..., None], 3, axis=-1)
+
+    overlay = np.stack([1 - b, 1 - np.maximum(a, b), 1 - a], axis=-1)
+    gap = np.full((a.shape[0], 2, 3), 0.8)
+    strip = np.concatenate([grey(a), gap, overlay, gap, grey(b)], axis=1)
+    return (strip * 255).round().astype(np.uint8)
+
+
+def image_name(key):
+    return re.sub(r"[^\w.+-]", "_", key) + ".png"
+
+
+def init_diff_worker(path_a, names_a, path_b, names_b, size, supersample, image_dir):
+    """ワーカーの初期化（両方のフォントを一度だけ開く）"""
+    state = compare_chunk
+    state.a = GlyphSource(path_a, names_a)
+    state.b = GlyphSource(path_b, names_b)
+    state.size = size
+    state.supersample = supersample
+    state.image_dir = image_dir
+
+
+def _rasterize_pair(key):
+    state = compare_chunk
+    _, a_value = state.a.record(key)
+    _, b_value = state.b.record(key)
+    a = rasterize(a_value, state.a.units_per_em, state.a.descender, state.size, state.supersample)
+    b = rasterize(b_value, state.b.units_per_em, state.b.descender, state.size, state.supersample)
+    return a, b
+
+
+def compare_chunk(keys):
+    """キーごとにアウトラインのハッシュを比べ、違うものだけを描いて差を測る
+
+    Returns:
+        Tuple[int, List[Tuple[str, float, int, int]]]: 同一だったグリフの数と、
+            変化したグリフの (キー, 被覆率の差の合計, 差が半分を超えるピクセル数, 送り幅の差)
+    """
+    state = compare_chunk
+    identical = 0
+    changed = []
+    for key in keys:
+        a_width, a_value = state.a.record(key)
+        b_width, b_value = state.b.record(key)
+        if outline_hash(a_width, a_value) == outline_hash(b_width, b_value):
+            identical += 1
+            continue
+        a = rasterize(a_value, state.a.units_per_em, state.a.descender, state.size, state.supersample)
+        b = rasterize(b_value, state.b.units_per_em, state.b.descender, state.size, state.supersample)
+        diff = np.abs(a - b)
+        changed.append((key, round(float(diff.sum()), 3), int((diff > 0.5).sum()), round(b_width - a_width, 3)))
+    return identical, changed
+
+
+def render_chunk(keys):
+    """コンタクトシートに載せるグリフの画像を書き出す"""
+    state = compare_chunk
+    for key in keys:
+        a, b = _rasterize_pair(key)
+        with open(os.path.join(state.image_dir, image_name(key)), "wb") as f:
+            f.write(png_bytes(contact_image(a, b)))
+    return len(keys)
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _label(key):
+    """U+XXXX のキーには文字そのものを添える"""
+    if key.startswith("U+"):
+        char = chr(int(key[2:], 16))
+        if char.isprintable():
+            return f"{char} {key}"
+    return key
+
+
+def write_contact_sheet(output_dir, summary, ranked, limit):
+    """差の大きい順に並べた HTML のコンタクトシートを書き出す"""
+    cards = []
+    for key, score, pixels, advance in ranked[:limit]:
+        advance_text = f", advance {advance:+g}" if advance else ""
+        cards.append(
+            '<figure class="glyph">'
+            f'<img src="images/{html.escape(image_name(key))}" alt="{html.escape(key)}">'
+            f'<figcaption><strong>{html.escape(_label(key))}</strong>'
+            f'<span>{score:.1f} px ({pixels} px){advance_text}</span></figcaption>'
+            '</figure>'
+        )
+    rows = "".join(f"<tr><th>{html.escape(k)}</th><td>{html.escape(str(v))}</td></tr>" for k, v in summary.items()
+                   if not isinstance(v, list))
+    more = f"<p>Showing the top {limit} of {len(ranked)} visibly changed glyphs (see diff.json).</p>" if len(ranked) > limit else ""
+    page = f"""<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="UTF-8">
+<title>Diff: {html.escape(summary['a'])} vs {html.escape(summary['b'])}</title>
+<style>
+body {{ font-family: sans-serif; margin: 20px; background: #fafafa; }}
+table {{ border-collapse: collapse; margin-bottom: 12px; }}
+th, td {{ text-align: left; padding: 2px 12px 2px 0; font-size: 13px; }}
+.legend span {{ display: inline-block; padding: 0 6px; margin-right: 8px; color: #fff; }}
+.sheet {{ display: flex; flex-wrap: wrap; gap: 8px; }}
+.glyph {{ margin: 0; padding: 6px; background: #fff; border: 1px solid #ddd; }}
+.glyph img {{ display: block; image-rendering: pixelated; width: {summary['size'] * 3 * 2 + 8}px; }}
+.glyph figcaption {{ font-size: 12px; display: flex; justify-content: space-between; gap: 8px; margin-top: 4px; }}
+</style>
+</head>
+<body>
+<h1>Visual diff</h1>
+<table>{rows}</table>
+<p class="legend">A | overlay | B &mdash; <span style="background:#d00">only in A</span><span style="background:#00d">only in B</span></p>
+{more}
+<div class="sheet">
+{chr(10).join(cards)}
+</div>
+</body>
+</html>
+"""
+    path = os.path.join(output_dir, "index.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(page)
+    return path
+
+
+def diff_fonts(path_a, path_b, output_dir, size=48, supersample=4, max_workers=None, limit=500, chunk_size=500):
+    """2つのビルド（OTF/TTF または UFO）をグリフごとに比べ、差の大きい順のコンタクトシートを作る
+
+    アウトラインのハッシュが同じグリフは描かずに飛ばし、違うものだけを小さなサイズで
+    並列に描いて被覆率の差を測る。画像は上位 limit 件だけ書き出す。
+
+    Returns:
+        dict: 集計（'identical', 'changed', 'visible', 'only_a', 'only_b' など）
+    """
+    start = datetime.datetime.now()
+    print(f"[{start}] Reading glyph lists...")
+    a, b = GlyphSource(path_a), GlyphSource(path_b)
+    common = sorted(a.names.keys() & b.names.keys())
+    only_a = sorted(a.names.keys() - b.names.keys())
+    only_b = sorted(b.names.keys() - a.names.keys())
+
+    image_dir = os.path.join(output_dir, "images")
+    os.makedirs(image_dir, exist_ok=True)
+    for name in os.listdir(image_dir):
+        if name.endswith(".png"):
+            os.remove(os.path.join(image_dir, name))
+
+    initargs = (path_a, a.names, path_b, b.names, size, supersample, image_dir)
+    print(f"[{datetime.datetime.now()}] Comparing {len(common)} glyphs...")
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_diff_worker, initargs=initargs) as executor:
+        identical = 0
+        changed = []
+        for count, results in executor.map(compare_chunk, _chunks(common, chunk_size)):
+            identical += count
+            changed.extend(results)
+        ranked = sorted((c for c in changed if c[1] > 0), key=lambda c: (-c[1], c[0]))
+        print(f"[{datetime.datetime.now()}] {len(changed)} changed outlines, {len(ranked)} visible at {size}px; "
+              f"rendering the top {min(limit, len(ranked))}...")
+        shown = [c[0] for c in ranked[:limit]]
+        list(executor.map(render_chunk, _chunks(shown, max(1, chunk_size // 10))))
+
+    summary = {
+        "a": path_a,
+        "b": path_b,
+        "size": size,
+        "compared": len(common),
+        "identical": identical,
+        "changed": len(changed),
+        "visible": len(ranked),
+        "only_a": only_a,
+        "only_b": only_b,
+        "created": datetime.datetime.now().astimezone().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(output_dir, "diff.json"), "w", encoding="utf-8") as f:
+        json.dump({**summary, "glyphs": [{"key": k, "score": s, "pixels": p, "advance": w} for k, s, p, w in
+                                         sorted(changed, key=lambda c: (-c[1], c[0]))]},
+                  f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    sheet_summary = {**summary, "only_a": len(only_a), "only_b": len(only_b)}
+    page = write_contact_sheet(output_dir, sheet_summary, ranked, limit)
+    elapsed = (datetime.datetime.now() - start).total_seconds()
+    print(f"[{datetime.datetime.now()}] Wrote {page} ({elapsed:.1f}s): {identical} identical, {len(changed)} changed, "
+          f"{len(ranked)} visible, {len(only_a)} only in A, {len(only_b)} only in B")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two builds glyph by glyph and write an HTML contact sheet ranked by pixel difference.")
+    parser.add_argument("a", help="Old build (OTF/TTF or UFO directory)")
+    parser.add_argument("b", help="New build (OTF/TTF or UFO directory)")
+    parser.add_argument("--output-dir", help=f"Output directory (default: {DEFAULT_DIFF_DIR}/<a>-vs-<b>, listed by serve_preview.py)")
+    parser.add_argument("--size", type=int, default=48, help="Raster size in pixels per em (default: 48)")
+    parser.add_argument("--supersample", type=int, default=4, help="Samples per pixel along each axis (default: 4)")
+    parser.add_argument("--limit", type=int, default=500, help="Glyphs to show on the contact sheet (default: 500)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="Number of worker processes (default: half of cores)")
+    args = parser.parse_args()
+
+    def stem(path):
+        return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+    output_dir = args.output_dir or os.path.join(DEFAULT_DIFF_DIR, f"{stem(args.a)}-vs-{stem(args.b)}")
+    diff_fonts(args.a, args.b, output_dir, size=args.size, supersample=args.supersample,
+               max_workers=args.workers, limit=args.limit)
+
+
+if __name__ == "__main__":
+    main()
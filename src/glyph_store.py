@@ -0,0 +1,288 @@
+import json
+import mmap
+import struct
+import numpy as np
+
+# バイナリグリフストア（.ntgs）
+#
+# ヘッダ: magic(8) + 各セクションの要素数とオフセット
+# セクション（すべて8バイト境界に配置、リトルエンディアン）:
+#   glyphs   : GLYPH_DTYPE × グリフ数
+#   contours : CONTOUR_DTYPE × 輪郭数
+#   coords   : float32 (x, y) × 点数
+#   segments : uint8 × 点数（SEGMENT_TYPES のインデックス、最上位ビットが smooth）
+#   unicodes : uint32 × Unicode 数
+#   names    : UTF-8 のグリフ名を連結したもの
+#   meta     : フォント情報・フィーチャー・カーニング等の JSON
+
+MAGIC = b"NTGS\x00\x01\x00\x00"
+HEADER_FORMAT = "<8s14Q"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+GLYPH_DTYPE = np.dtype([
+    ("contour_start", "<u4"),
+    ("contour_count", "<u4"),
+    ("unicode_start", "<u4"),
+    ("unicode_count", "<u4"),
+    ("name_offset", "<u4"),
+    ("name_length", "<u4"),
+    ("width", "<f4"),
+    ("height", "<f4"),
+])
+CONTOUR_DTYPE = np.dtype([
+    ("point_start", "<u4"),
+    ("point_count", "<u4"),
+    ("clockwise", "u1"),
+    ("reserved", "u1", (7,)),
+])
+
+SEGMENT_TYPES = (None, "move", "line", "curve", "qcurve")
+SEGMENT_CODES = {t: i for i, t in enumerate(SEGMENT_TYPES)}
+SMOOTH_FLAG = 0x80
+
+
+class GlyphStoreError(Exception):
+    """グリフストアの形式が不正"""
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _font_meta(font, extras):
+    from fontTools.ufoLib import fontInfoAttributesVersion3
+
+    info = {}
+    for attr in fontInfoAttributesVersion3:
+        if attr == "guidelines":
+            continue
+        value = getattr(font.info, attr, None)
+        if value is not None:
+            info[attr] = value
+    return {
+        "info": info,
+        "features": font.features.text or "",
+        "kerning": [[l, r, v] for (l, r), v in font.kerning.items()],
+        "groups": {k: list(v) for k, v in font.groups.items()},
+        "lib": dict(font.lib),
+        "extras": extras,
+    }
+
+
+def write_store(font, path):
+    """defcon.Font をバイナリグリフストアとして書き出す"""
+    names = list(font.glyphOrder) or sorted(font.keys())
+    names += sorted(set(font.keys()) - set(names))
+    names = [n for n in names if n in font]
+
+    glyphs = np.zeros(len(names), dtype=GLYPH_DTYPE)
+    contours = []
+    coords = []
+    segments = []
+    unicodes = []
+    name_blob = bytearray()
+    extras = {}
+
+    for gi, name in enumerate(names):
+        glyph = font[name]
+        encoded = name.encode("utf-8")
+        rec = glyphs[gi]
+        rec["contour_start"] = len(contours)
+        rec["contour_count"] = len(glyph)
+        rec["unicode_start"] = len(unicodes)
+        rec["unicode_count"] = len(glyph.unicodes)
+        rec["name_offset"] = len(name_blob)
+        rec["name_length"] = len(encoded)
+        rec["width"] = glyph.width
+        rec["height"] = glyph.height
+        name_blob += encoded
+        unicodes.extend(glyph.unicodes)
+
+        for contour in glyph:
+            contours.append((len(coords), len(contour), contour.clockwise, (0,) * 7))
+            for p in contour:
+                coords.append((p.x, p.y))
+                segments.append(SEGMENT_CODES[p.segmentType] | (SMOOTH_FLAG if p.smooth else 0))
+
+        # アウトライン以外のデータ（CJK の OTF 由来なら通常は空）は JSON に退避
+        extra = {}
+        if glyph.components:
+            extra["components"] = [[c.baseGlyph, list(c.transformation)] for c in glyph.components]
+        if glyph.anchors:
+            extra["anchors"] = [[a.name, a.x, a.y] for a in glyph.anchors]
+        if extra:
+            extras[name] = extra
+
+    contour_arr = np.array(contours, dtype=CONTOUR_DTYPE) if contours else np.zeros(0, dtype=CONTOUR_DTYPE)
+    coord_arr = np.array(coords, dtype="<f4").reshape(-1, 2)
+    segment_arr = np.array(segments, dtype="u1")
+    unicode_arr = np.array(unicodes, dtype="<u4")
+    meta_blob = json.dumps(_font_meta(font, extras), ensure_ascii=False).encode("utf-8")
+
+    sections = [glyphs.tobytes(), contour_arr.tobytes(), coord_arr.tobytes(),
+                segment_arr.tobytes(), unicode_arr.tobytes(), bytes(name_blob), meta_blob]
+    offsets = []
+    offset = _align(HEADER_SIZE)
+    for data in sections:
+        offsets.append(offset)
+        offset = _align(offset + len(data))
+
+    counts = [len(names), len(contour_arr), len(coord_arr), len(unicode_arr), len(name_blob), len(meta_blob), 0]
+    header = struct.pack(HEADER_FORMAT, MAGIC, *counts, *offsets)
+
+    with open(path, "wb") as f:
+        f.write(header)
+        for data, section_offset in zip(sections, offsets):
+            f.seek(section_offset)
+            f.write(data)
+    return path
+
+
+class GlyphStore:
+    """mmap したグリフストアからグリフを読み出すクラス
+
+    配列はすべて mmap 上のビューなので、複数のワーカーが同じページを共有する。
+    defcon の Layer に glyphSet として渡せる最低限のインターフェースも備える。
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        fields = struct.unpack_from(HEADER_FORMAT, self._mm, 0)
+        if fields[0] != MAGIC:
+            raise GlyphStoreError(f"Not a glyph store: {self.path}")
+        n_glyphs, n_contours, n_points, n_unicodes, names_len, meta_len, _ = fields[1:8]
+        (glyphs_off, contours_off, coords_off, segments_off,
+         unicodes_off, names_off, meta_off) = fields[8:15]
+
+        self.glyphs = np.frombuffer(self._mm, dtype=GLYPH_DTYPE, count=n_glyphs, offset=glyphs_off)
+        self.contours = np.frombuffer(self._mm, dtype=CONTOUR_DTYPE, count=n_contours, offset=contours_off)
+        self.coords = np.frombuffer(self._mm, dtype="<f4", count=n_points * 2, offset=coords_off).reshape(-1, 2)
+        self.segments = np.frombuffer(self._mm, dtype="u1", count=n_points, offset=segments_off)
+        self.unicodes = np.frombuffer(self._mm, dtype="<u4", count=n_unicodes, offset=unicodes_off)
+        self._names_off = names_off
+
+        self.names = [self._read_name(i) for i in range(n_glyphs)]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.meta = json.loads(self._mm[meta_off:meta_off + meta_len].decode("utf-8"))
+        # defcon の Layer が参照する（.glif ファイルは存在しないので空）
+        self.contents = {}
+
+    def _read_name(self, i):
+        rec = self.glyphs[i]
+        start = self._names_off + int(rec["name_offset"])
+        return self._mm[start:start + int(rec["name_length"])].decode("utf-8")
+
+    def close(self):
+        # 配列ビューが残っていると mmap を閉じられないため、参照を外してから閉じる
+        self.glyphs = self.contours = self.coords = self.segments = self.unicodes = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    def glyph_unicodes(self, i):
+        rec = self.glyphs[i]
+        start = int(rec["unicode_start"])
+        return [int(u) for u in self.unicodes[start:start + int(rec["unicode_count"])]]
+
+    def unicode_map(self):
+        """{Unicode: [グリフ名]} を返す（グリフを読み込まずに対象判定ができる）"""
+        cmap = {}
+        for i, name in enumerate(self.names):
+            for uni in self.glyph_unicodes(i):
+                cmap.setdefault(uni, []).append(name)
+        return cmap
+
+    def glyph_data(self, i):
+        """ワーカー用のグリフ辞書（FontProcessor._extract_glyph_data と同じ形式）を返す"""
+        rec = self.glyphs[i]
+        start = int(rec["contour_start"])
+        contours = []
+        for c in self.contours[start:start + int(rec["contour_count"])]:
+            p0 = int(c["point_start"])
+            p1 = p0 + int(c["point_count"])
+            xy = self.coords[p0:p1].tolist()
+            segs = self.segments[p0:p1].tolist()
+            points = [{'x': x, 'y': y, 'segmentType': SEGMENT_TYPES[s & ~SMOOTH_FLAG], 'smooth': bool(s & SMOOTH_FLAG)}
+                      for (x, y), s in zip(xy, segs)]
+            contours.append({'clockwise': bool(c["clockwise"]), 'points': points})
+        return {'name': self.names[i], 'contours': contours}
+
+    # --- defcon Layer 用の glyphSet インターフェース ---
+
+    def keys(self):
+        return list(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def readLayerInfo(self, layer, validateRead=None):
+        pass
+
+    def getUnicodes(self, glyphNames=None):
+        names = self.names if glyphNames is None else glyphNames
+        return {name: self.glyph_unicodes(self.index[name]) for name in names}
+
+    def getComponentReferences(self, glyphNames=None):
+        refs = {}
+        for name, extra in self.meta["extras"].items():
+            for base, _ in extra.get("components", []):
+                refs.setdefault(base, set()).add(name)
+        return refs
+
+    def getImageReferences(self, glyphNames=None):
+        return {}
+
+    def readGlyph(self, glyphName, glyphObject=None, pointPen=None):
+        i = self.index[glyphName]
+        rec = self.glyphs[i]
+        if glyphObject is not None:
+            glyphObject.width = float(rec["width"])
+            glyphObject.height = float(rec["height"])
+            glyphObject.unicodes = self.glyph_unicodes(i)
+        if pointPen is None:
+            return
+        start = int(rec["contour_start"])
+        for c in self.contours[start:start + int(rec["contour_count"])]:
+            p0 = int(c["point_start"])
+            p1 = p0 + int(c["point_count"])
+            pointPen.beginPath()
+            for (x, y), s in zip(self.coords[p0:p1].tolist(), self.segments[p0:p1].tolist()):
+                pointPen.addPoint((x, y), segmentType=SEGMENT_TYPES[s & ~SMOOTH_FLAG], smooth=bool(s & SMOOTH_FLAG))
+            pointPen.endPath()
+        extra = self.meta["extras"].get(glyphName, {})
+        for base, transformation in extra.get("components", []):
+            pointPen.addComponent(base, tuple(transformation))
+        if glyphObject is not None:
+            for name, x, y in extra.get("anchors", []):
+                glyphObject.appendAnchor({"name": name, "x": x, "y": y})
+
+    def to_font(self):
+        """ストアを glyphSet とする defcon.Font を返す（グリフは参照時に遅延読み込み）"""
+        import defcon
+
+        font = defcon.Font()
+        meta = self.meta
+        for attr, value in meta["info"].items():
+            setattr(font.info, attr, value)
+        font.features.text = meta["features"]
+        for l, r, v in meta["kerning"]:
+            font.kerning[(l, r)] = v
+        for k, v in meta["groups"].items():
+            font.groups[k] = v
+        font.lib.update(meta["lib"])
+
+        layer = font.layers.newLayer("public.store", glyphSet=self)
+        old_default = font.layers.defaultLayer
+        font.layers.defaultLayer = layer
+        del font.layers[old_default.name]
+        layer.name = old_default.name
+        font.dirty = False
+        return font
+
@@ -0,0 +1,195 @@
+import copy
+import hashlib
+import os
+import pickle
+import datetime
+import fontTools
+import ufo2ft
+from fontTools.feaLib import ast
+from fontTools.ttLib import newTable
+from fontTools.otlLib.maxContextCalc import maxCtxFont
+from ufo2ft.featureCompiler import FeatureCompiler, parseLayoutFeatures
+
+# キャッシュ対象のレイアウトテーブル（エフェクトはアウトラインしか変更しない）
+LAYOUT_TABLES = ("GDEF", "GSUB", "GPOS", "BASE")
+
+
+def parse_features(font):
+    """features.fea を feaLib の AST として解析する（include は展開される）"""
+    return parseLayoutFeatures(font)
+
+
+def sanitize_aalt(doc):
+    """aalt ブロック内の script / language 文を AST 上で取り除く
+
+    Returns:
+        bool: 変更があった場合 True
+    """
+    changed = False
+    for st in doc.statements:
+        if isinstance(st, ast.FeatureBlock) and st.name == "aalt":
+            kept = [s for s in st.statements
+                    if not isinstance(s, (ast.ScriptStatement, ast.LanguageStatement))]
+            if len(kept) != len(st.statements):
+                st.statements = kept
+                changed = True
+    return changed
+
+
+def is_cacheable(doc):
+    """レイアウト以外のテーブルを書き換える table ブロックがなければキャッシュ可能"""
+    for st in doc.statements:
+        if isinstance(st, ast.TableBlock) and st.name not in LAYOUT_TABLES:
+            return False
+    return True
+
+
+class LayoutCache:
+    """コンパイル済み GSUB/GPOS/GDEF をディスクにキャッシュするクラス
+
+    キーはフィーチャーテキスト・グリフ順・フィーチャーライターの入力
+    （カーニング、グループ、アンカー、cmap）とツールのバージョンのハッシュ。
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, features_text, ufo, glyph_order, glyph_set):
+        h = hashlib.sha256()
+        h.update(f"fonttools={fontTools.version};ufo2ft={ufo2ft.__version__}\0".encode())
+        h.update(features_text.encode("utf-8"))
+        h.update(b"\0glyphOrder\0")
+        h.update("\n".join(glyph_order).encode("utf-8"))
+        h.update(b"\0kerning\0")
+        h.update(repr(sorted(ufo.kerning.items())).encode("utf-8"))
+        h.update(b"\0groups\0")
+        h.update(repr(sorted((k, list(v)) for k, v in ufo.groups.items())).encode("utf-8"))
+        h.update(b"\0categories\0")
+        h.update(repr(sorted(ufo.lib.get("public.openTypeCategories", {}).items())).encode("utf-8"))
+        h.update(b"\0glyphs\0")
+        for name in glyph_order:
+            glyph = glyph_set[name]
+            anchors = [(a.name, a.x, a.y) for a in getattr(glyph, "anchors", [])]
+            h.update(f"{name}:{list(glyph.unicodes)}:{anchors}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pickle")
+
+    def load(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                tables = pickle.load(f)
+        except Exception as e:
+            print(f"[{datetime.datetime.now()}] Ignoring broken layout cache {path}: {e}")
+            return None
+        # build_cache.prune は更新時刻の古い順に消すため、使ったものは新しくしておく
+        os.utime(path)
+        return tables
+
+    def store(self, key, tables):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+    def make_compiler_class(self, doc):
+        """解析済み AST を再利用し、キャッシュを参照する FeatureCompiler を生成する"""
+        cache = self
+        features_text = doc.asFea()
+
+        class CachedFeatureCompiler(FeatureCompiler):
+            def setupFeatures(self):
+                if self.featureWriters:
+                    # 再解析せず解析済みの AST を使う（ライターが書き換えるのでコピーを渡す）
+                    featureFile = copy.deepcopy(doc)
+                    for writer in self.featureWriters:
+                        writer.write(self.ufo, featureFile, compiler=self)
+                    self.features = featureFile.asFea()
+                else:
+                    self.features = features_text
+
+            def compile(self):
+                glyph_order = self.ttFont.getGlyphOrder()
+                key = cache.make_key(features_text, self.ufo, glyph_order, self.glyphSet)
+                tables = cache.load(key)
+                if tables is not None:
+                    cache.hits += 1
+                    print(f"[{datetime.datetime.now()}] Layout cache hit ({key[:12]}), skipping feature compilation.")
+                    for tag, data in tables.items():
+                        table = newTable(tag)
+                        table.decompile(data, self.ttFont)
+                        self.ttFont[tag] = table
+                    # feaLib のビルドで設定される値をキャッシュ利用時も同じように設定する
+                    if "OS/2" in self.ttFont:
+                        self.ttFont["OS/2"].usMaxContext = maxCtxFont(self.ttFont)
+                    return self.ttFont
+
+                cache.misses += 1
+                print(f"[{datetime.datetime.now()}] Layout cache miss ({key[:12]}), compiling features...")
+                super().compile()
+                tables = {tag: self.ttFont[tag].compile(self.ttFont)
+                          for tag in LAYOUT_TABLES if tag in self.ttFont}
+                cache.store(key, tables)
+                return self.ttFont
+
+        return CachedFeatureCompiler
+
+
+def _table_bytes(path):
+    """フォントのテーブルごとのバイト列（head の作成・更新日時とチェックサムは除く）"""
+    from fontTools.ttLib import TTFont
+    font = TTFont(path, recalcTimestamp=False)
+    font["head"].created = font["head"].modified = 0
+    font["head"].checkSumAdjustment = 0
+    return {tag: font.getTableData(tag) if tag != "head" else font["head"].compile(font)
+            for tag in font.reader.keys()}
+
+
+def check_cache(input_path, work_dir=None):
+    """キャッシュなし・キャッシュミス・キャッシュヒットの3通りでビルドし、出力が同じか確かめる
+
+    Returns:
+        List[str]: 内容が異なったテーブル（空なら一致）
+    """
+    import tempfile
+    from processor import FontProcessor
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        cache_dir = os.path.join(tmp, "layout")
+        processor = FontProcessor(input_path)
+        processor.load()
+        paths = {}
+        for label, layout_cache_dir in (("baseline", None), ("miss", cache_dir), ("hit", cache_dir)):
+            paths[label] = os.path.join(tmp, f"{label}.otf")
+            processor.save_otf(paths[label], optimize_cff=False, layout_cache_dir=layout_cache_dir)
+        tables = {label: _table_bytes(path) for label, path in paths.items()}
+
+    differing = []
+    for tag in sorted(set().union(*tables.values())):
+        values = [tables[label].get(tag) for label in paths]
+        if any(value != values[0] for value in values):
+            differing.append(tag)
+    return differing
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Check that builds with a layout cache hit, a miss and no cache are identical.")
+    parser.add_argument("--input", required=True, help="Input UFO directory or glyph store (.ntgs)")
+    args = parser.parse_args()
+
+    differing = check_cache(args.input)
+    if differing:
+        print(f"Layout cache changes the output: {', '.join(differing)} differ between cached and uncached builds.")
+        raise SystemExit(1)
+    print("Layout cache hit, miss and uncached builds are identical.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 import datetime
 
+# update で決まる情報から作られる name ID（それ以外の既存のレコードはそのまま残す）
+MANAGED_NAME_IDS = {1, 2, 3, 4, 5, 6, 8, 9, 10, 12, 13, 14, 16, 17, 18, 19, 21, 22}
+
+
 class MetadataManager:
     """フォントのメタデータ更新を担当するクラス"""
 
@@ -52,3 +56,59 @@ class MetadataManager:
             "Masataka HATTORI 服部正貴 (production & ideograph elements); "
             "Zachary Quinn Scheuren (variable font & overall production) Nothing Japanese Font Project Team"
         )
+
+    @staticmethod
+    def patch_font(font_path, output_path, name, weight, designer, vendor_id,
+                   license_text=None, license_url="http://scripts.sil.org/OFL"):
+        """ビルド済みのフォントの name / OS/2 / head だけを update と同じ規則で書き換える
+
+        空の UFO の info に update を適用し、ufo2ft と同じ方法で name テーブルと
+        OS/2・head のスタイル関連の値を作り直す。アウトラインやレイアウトのテーブルは
+        読み込まずにそのまま書き戻すため、エフェクト・コンパイル・サブルーチン化は不要。
+        CFF2 の Top DICT には名前が無いので変更しない。OS/2 の usWeightClass は update が
+        設定しないため元の値のまま。
+
+        Args:
+            font_path: ビルド済みの OTF / TTF
+            output_path: 書き出し先
+        """
+        import defcon
+        from types import SimpleNamespace
+        from fontTools.ttLib import TTFont
+        from fontTools.ttLib.tables._h_e_a_d import mac_epoch_diff
+        from ufo2ft.outlineCompiler import BaseOutlineCompiler
+        from ufo2ft.fontInfoData import getAttrWithFallback, dateStringForNow, dateStringToTimeValue
+
+        ufo = defcon.Font()
+        MetadataManager.update(ufo, name, weight, designer, vendor_id, license_text, license_url)
+        info = ufo.info
+
+        font = TTFont(font_path)
+        # name: ufo2ft の name テーブル生成をそのまま使う
+        builder = SimpleNamespace(ufo=ufo, otf={}, tables={"name"})
+        BaseOutlineCompiler.setupTable_name(builder)
+        new_name = builder.otf["name"]
+        if "name" in font:
+            for record in font["name"].names:
+                if record.nameID not in MANAGED_NAME_IDS:
+                    new_name.names.append(record)
+        new_name.names.sort()
+        font["name"] = new_name
+
+        style_map = getAttrWithFallback(info, "styleMapStyleName")
+        bold = style_map in ("bold", "bold italic")
+        italic = style_map in ("italic", "bold italic")
+
+        head = font["head"]
+        head.fontRevision = round(float("%d.%03d" % (info.versionMajor, info.versionMinor)), 3)
+        head.modified = dateStringToTimeValue(dateStringForNow()) - mac_epoch_diff
+        head.macStyle = (head.macStyle & ~0b11) | (bold << 0) | (italic << 1)
+
+        if "OS/2" in font:
+            os2 = font["OS/2"]
+            os2.achVendID = info.openTypeOS2VendorID
+            # bit 0: ITALIC, 5: BOLD, 6: REGULAR（USE_TYPO_METRICS などは残す）
+            os2.fsSelection = (os2.fsSelection & ~0b1100001) | (italic << 0) | (bold << 5) | ((style_map == "regular") << 6)
+
+        font.save(output_path)
+        font.close()
@@ -1,59 +1,214 @@
-import defcon
-import ufo2ft
 import datetime
-import tqdm
-import re
+import time
 import os
-from concurrent.futures import ProcessPoolExecutor
-from effects import HorizontalBolder, HorizontalStrokeLeftCut, InkTrap, SerifTrapezoid, CornerEnhancer, CornerRounder, Normalizer
+import copy
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from glyph_store import GlyphStore
+from effects import HorizontalBolder, HorizontalStrokeLeftCut, InkTrap, SerifTrapezoid, CornerEnhancer, CornerRounder, Normalizer, OutlineSimplifier
+from validator import OutlineValidator, ERROR_TYPES
 
-def process_glyph_worker(glyph_data):
-    """並列処理用ワーカー（インスタンスを再利用して高速化）"""
-    # init_workerで事前に生成されたインスタンスを取得
-    bolder = getattr(process_glyph_worker, 'bolder', HorizontalBolder(adjust=9))
-    left_cut = getattr(process_glyph_worker, 'left_cut', HorizontalStrokeLeftCut())
-    ink_trap = getattr(process_glyph_worker, 'ink_trap', InkTrap())
-    serif_trap = getattr(process_glyph_worker, 'serif_trap', SerifTrapezoid())
-    enhancer = getattr(process_glyph_worker, 'enhancer', CornerEnhancer())
-    rounder = getattr(process_glyph_worker, 'rounder', CornerRounder(size=12))
-    normalizer = getattr(process_glyph_worker, 'normalizer', Normalizer())
-    
-    bolder.apply(glyph_data)
-    left_cut.apply(glyph_data)
-    ink_trap.apply(glyph_data)
-    serif_trap.apply(glyph_data)
-    enhancer.apply(glyph_data)
-    # rounder.apply(glyph_data)  # 一時的に無効化
-    normalizer.apply(glyph_data)
+# エフェクトの既定パラメータ（クラス名 -> コンストラクタ引数）
+DEFAULT_EFFECT_PARAMS = {
+    "HorizontalBolder": {"adjust": 9},
+    "HorizontalStrokeLeftCut": {},
+    "InkTrap": {},
+    "SerifTrapezoid": {},
+    "CornerEnhancer": {},
+    "CornerRounder": {"size": 12},
+    "Normalizer": {},
+}
+
+# エフェクトの対象とするブロック（開始, 終了, 名前）
+TARGET_BLOCKS = (
+    (0x4E00, 0x9FFF, "CJK Unified Ideographs"),
+    (0x3400, 0x4DBF, "CJK Unified Ideographs Extension A"),
+    (0x20000, 0x3FFFF, "CJK Extensions (BMP outside)"),
+    (0xF900, 0xFAFF, "CJK Compatibility Ideographs"),
+    (0x2E80, 0x2FDF, "CJK Radicals Supplement"),
+    (0x3005, 0x3005, "々"),
+    (0x303B, 0x303B, "〻"),
+)
+
+EFFECT_CLASSES = {
+    "HorizontalBolder": HorizontalBolder,
+    "HorizontalStrokeLeftCut": HorizontalStrokeLeftCut,
+    "InkTrap": InkTrap,
+    "SerifTrapezoid": SerifTrapezoid,
+    "CornerEnhancer": CornerEnhancer,
+    "CornerRounder": CornerRounder,
+    "Normalizer": Normalizer,
+    "OutlineSimplifier": OutlineSimplifier,
+    "OutlineValidator": OutlineValidator,
+}
+
+# apply_effects でアウトラインを変えないエフェクト（CornerRounder は一時的に無効化中）
+OUTLINE_NEUTRAL_EFFECTS = ("CornerRounder", "OutlineValidator")
+
+def create_effects(rs, effect_params=None):
+    """エフェクトのインスタンスを生成する
+
+    Args:
+        rs: 角丸サイズ（--round-size）
+        effect_params: {クラス名: {引数名: 値}} 形式の上書きパラメータ
+
+    Returns:
+        Dict[str, GlyphEffect]: クラス名をキーとしたエフェクトのインスタンス
+    """
+    effects = {}
+    for cls_name, defaults in DEFAULT_EFFECT_PARAMS.items():
+        kwargs = dict(defaults)
+        if cls_name == "CornerRounder":
+            kwargs["size"] = rs if rs != 20 else 12
+        if effect_params and cls_name in effect_params:
+            kwargs.update(effect_params[cls_name])
+        effects[cls_name] = EFFECT_CLASSES[cls_name](**kwargs)
+    # 簡略化はオプション（パラメータが指定された場合のみ有効）
+    if effect_params and "OutlineSimplifier" in effect_params:
+        effects["OutlineSimplifier"] = OutlineSimplifier(**effect_params["OutlineSimplifier"])
+    # 検査もオプション（アウトラインは変更せず、問題を glyph_data['issues'] に記録する）
+    if effect_params and "OutlineValidator" in effect_params:
+        effects["OutlineValidator"] = OutlineValidator(**effect_params["OutlineValidator"])
+    return effects
+
+def apply_effects(effects, glyph_data):
+    """エフェクトを順に適用し、座標を整数に丸める"""
+    effects["HorizontalBolder"].apply(glyph_data)
+    effects["HorizontalStrokeLeftCut"].apply(glyph_data)
+    effects["InkTrap"].apply(glyph_data)
+    effects["SerifTrapezoid"].apply(glyph_data)
+    effects["CornerEnhancer"].apply(glyph_data)
+    # effects["CornerRounder"].apply(glyph_data)  # 一時的に無効化
+    effects["Normalizer"].apply(glyph_data)
     
     # 座標を整数に丸める（浮動小数点を排除してファイルサイズを削減）
     for contour in glyph_data['contours']:
         for p in contour['points']:
             p['x'] = int(round(p['x']))
             p['y'] = int(round(p['y']))
+
+    # 丸めで重なった点もまとめて除去するため、簡略化は丸めの後に行う
+    if "OutlineSimplifier" in effects:
+        effects["OutlineSimplifier"].apply(glyph_data)
+
+    # 最終的なアウトラインを検査する（ワーカー内で行い、コンパイル前に問題を検出する）
+    if "OutlineValidator" in effects:
+        effects["OutlineValidator"].apply(glyph_data)
                 
     return glyph_data
 
-def init_worker(rs):
+# forkserver に事前に読み込ませるモジュール（ワーカーはここから fork されるので再 import しない）
+WORKER_PRELOAD = ["processor"]
+
+def get_worker_context():
+    """ワーカープロセス用の multiprocessing コンテキストを返す
+
+    forkserver が使える環境では、エフェクトと numpy を一度だけ読み込んだ
+    サーバープロセスからワーカーを fork する。defcon / ufo2ft / tqdm は
+    コンパイル側でしか使わないため、ワーカーには読み込まれない。
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context()
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(WORKER_PRELOAD)
+    return ctx
+
+def process_glyph_worker(glyph_data):
+    """並列処理用ワーカー（インスタンスを再利用して高速化）"""
+    # init_workerで事前に生成されたインスタンスを取得
+    effects = getattr(process_glyph_worker, 'effects', None)
+    if effects is None:
+        effects = create_effects(20)
+    return apply_effects(effects, glyph_data)
+
+def init_worker(rs, effect_params=None):
     """ワーカープロセスの初期化（エフェクトを一度だけ生成）"""
-    process_glyph_worker.bolder = HorizontalBolder(adjust=9)
-    process_glyph_worker.left_cut = HorizontalStrokeLeftCut()
-    process_glyph_worker.ink_trap = InkTrap()
-    process_glyph_worker.serif_trap = SerifTrapezoid()
-    process_glyph_worker.enhancer = CornerEnhancer()
-    process_glyph_worker.rounder = CornerRounder(size=rs if rs != 20 else 12)
-    process_glyph_worker.normalizer = Normalizer()
+    process_glyph_worker.effects = create_effects(rs, effect_params)
+
+def process_store_worker(index):
+    """グリフストア入力時のワーカー（グリフ番号だけを受け取り、mmap から直接読む）"""
+    return process_glyph_worker(process_store_worker.store.glyph_data(index))
+
+def init_store_worker(rs, store_path, effect_params=None):
+    """グリフストア用ワーカーの初期化（ストアを mmap で開き、ページを親・他ワーカーと共有する）"""
+    init_worker(rs, effect_params)
+    process_store_worker.store = GlyphStore(store_path)
+
+def process_variant_worker(job):
+    """パラメータスイープ用ワーカー（job = (バリアント番号, グリフデータ)）"""
+    index, glyph_data = job
+    # グリフデータはジョブごとにpickleされるため、書き換えても他のバリアントには影響しない
+    return index, apply_effects(process_variant_worker.variants[index], glyph_data)
+
+def init_variant_worker(rs, variant_params):
+    """スイープ用ワーカーの初期化（全バリアントのエフェクトを一度だけ生成）"""
+    process_variant_worker.variants = [create_effects(rs, params) for params in variant_params]
+
+def process_quadratic_worker(glyph_data):
+    """cubic 曲線を quadratic 曲線に変換するワーカー（TrueType 出力用）
+
+    TrueType の輪郭の向きは PostScript と逆なので、変換と同時に反転する。
+    """
+    from fontTools.pens.cu2quPen import Cu2QuPointPen
+    from fontTools.pens.recordingPen import RecordingPointPen
+
+    recording = RecordingPointPen()
+    pen = Cu2QuPointPen(recording, process_quadratic_worker.max_err, reverse_direction=True)
+    for contour in glyph_data['contours']:
+        pen.beginPath()
+        for p in contour['points']:
+            pen.addPoint((p['x'], p['y']), segmentType=p['segmentType'], smooth=p['smooth'])
+        pen.endPath()
+
+    contours = []
+    for method, args, _ in recording.value:
+        if method == "beginPath":
+            points = []
+        elif method == "addPoint":
+            (x, y), segment_type, smooth = args[0], args[1], args[2]
+            points.append({'x': x, 'y': y, 'segmentType': segment_type, 'smooth': smooth})
+        elif method == "endPath":
+            contours.append({'clockwise': None, 'points': points})
+    glyph_data['contours'] = contours
+    return glyph_data
+
+def init_quadratic_worker(max_err):
+    """変換用ワーカーの初期化（全ワーカー・全ウエイトで同じ許容誤差を使う）"""
+    process_quadratic_worker.max_err = max_err
 
 class FontProcessor:
     """フォント全体の処理を統括するクラス"""
-    def __init__(self, input_path, round_size=20):
+    def __init__(self, input_path, round_size=20, simplify_tolerance=None, validate=False):
         self.input_path = input_path
         self.round_size = round_size
+        # 全グリフ共通のエフェクトパラメータの上書き
+        self.effect_params = {}
+        if simplify_tolerance is not None:
+            self.effect_params["OutlineSimplifier"] = {"tolerance": simplify_tolerance}
+        if validate:
+            self.effect_params["OutlineValidator"] = {}
+        self.simplify_stats = [0, 0, 0, 0]
+        # 検査で見つかった問題（グリフ名 -> 問題のリスト）
+        self.issues = {}
+        # 工程ごとの所要時間（秒）。CFF2 と TrueType の出力を比べるために記録する
+        self.timings = {}
+        # quadratic に変換済みのグリフ（エフェクトで書き換えられたら外す）
+        self._quadratic_names = set()
         self.font = None
+        self.store = None
+        self._features_doc = None
 
     def load(self):
-        print(f"[{datetime.datetime.now()}] Loading UFO: {self.input_path}")
-        self.font = defcon.Font(path=self.input_path)
+        if str(self.input_path).endswith(".ntgs"):
+            print(f"[{datetime.datetime.now()}] Opening glyph store: {self.input_path}")
+            # グリフは参照されたときに mmap から読み込まれる
+            self.store = GlyphStore(self.input_path)
+            self.font = self.store.to_font()
+        else:
+            print(f"[{datetime.datetime.now()}] Loading UFO: {self.input_path}")
+            import defcon
+            self.font = defcon.Font(path=self.input_path)
         print(f"[{datetime.datetime.now()}] Loaded {len(self.font)} glyphs.")
 
     def _extract_glyph_data(self, glyph):
@@ -66,24 +221,28 @@ class FontProcessor:
         return {'name': glyph.name, 'contours': contours}
 
     def _apply_glyph_data(self, glyph, data):
+        stats = data.get('simplify_stats')
+        if stats:
+            for i, v in enumerate(stats):
+                self.simplify_stats[i] += v
+        issues = data.get('issues')
+        if issues:
+            self.issues[glyph.name] = issues
+        self._quadratic_names.discard(glyph.name)
         glyph.clear()
+        # defcon をここで import しないよう、グリフのポイントペン経由で書き戻す
+        pen = glyph.getPointPen()
         for c_data in data['contours']:
-            contour = defcon.Contour()
+            pen.beginPath()
             for p in c_data['points']:
-                contour.appendPoint(defcon.Point((p['x'], p['y']), segmentType=p['segmentType'], smooth=p['smooth']))
-            glyph.appendContour(contour)
+                pen.addPoint((p['x'], p['y']), segmentType=p['segmentType'], smooth=p['smooth'])
+            pen.endPath()
 
     def is_target_glyph(self, unicode_val):
         """漢字や特定の記号を対象とする判定"""
         if unicode_val is None: return False
-        # 範囲チェックを最適化
-        return (0x4E00 <= unicode_val <= 0x9FFF or   # CJK Unified Ideographs
-                0x3400 <= unicode_val <= 0x4DBF or   # CJK Unified Ideographs Extension A
-                0x20000 <= unicode_val <= 0x3FFFF or # CJK Extensions (BMP outside)
-                0xF900 <= unicode_val <= 0xFAFF or   # CJK Compatibility Ideographs
-                0x2E80 <= unicode_val <= 0x2FDF or   # CJK Radicals Supplement
-                unicode_val in (0x3005, 0x303B))     # 々, 〻
-    def process(self, use_parallel=True, max_workers=None, subset_glyphs=None):
+        return any(start <= unicode_val <= end for start, end, _ in TARGET_BLOCKS)
+    def _collect_target_names(self, subset_glyphs=None):
         if subset_glyphs:
             target_names = subset_glyphs
             print(f"[{datetime.datetime.now()}] Subset mode: Processing {len(target_names)} specified glyphs.")
@@ -97,23 +256,45 @@ class FontProcessor:
             
             target_names = sorted(list(set(target_names)))
             print(f"[{datetime.datetime.now()}] Processing {len(target_names)} target glyphs.")
-        
+        return target_names
+
+    def process(self, use_parallel=True, max_workers=None, subset_glyphs=None, backend="process"):
+        """対象グリフにエフェクトを適用する
+
+        Args:
+            backend: "process"（ProcessPoolExecutor）または "thread"（ThreadPoolExecutor。
+                free-threaded Python 3.13t 向け）。use_parallel が False なら逐次処理
+        """
+        import tqdm
+        start = time.perf_counter()
+        target_names = self._collect_target_names(subset_glyphs)
         total_targets = len(target_names)
+        self.issues = {}
 
         def data_generator():
             for name in target_names:
                 yield self._extract_glyph_data(self.font[name])
 
-        if use_parallel:
+        if use_parallel and backend == "thread":
+            self._process_threaded(target_names, max_workers)
+        elif use_parallel:
             print(f"[{datetime.datetime.now()}] Starting parallel conversion (high-throughput)...")
             chunk_size = 100
+            if self.store is not None:
+                # ストア入力ならグリフ番号だけを送り、ワーカーが mmap から直接読む
+                worker, jobs = process_store_worker, (self.store.index[name] for name in target_names)
+                initializer, initargs = init_store_worker, (self.round_size, self.store.path, self.effect_params)
+            else:
+                worker, jobs = process_glyph_worker, data_generator()
+                initializer, initargs = init_worker, (self.round_size, self.effect_params)
             with ProcessPoolExecutor(
                 max_workers=max_workers, 
-                initializer=init_worker, 
-                initargs=(self.round_size,)
+                mp_context=get_worker_context(),
+                initializer=initializer, 
+                initargs=initargs
             ) as executor:
                 # 通信効率の良い map(chunksize) を使用
-                results_iter = executor.map(process_glyph_worker, data_generator(), chunksize=chunk_size)
+                results_iter = executor.map(worker, jobs, chunksize=chunk_size)
                 
                 # 通知を一括で止めて反映を高速化
                 self.font.holdNotifications()
@@ -124,7 +305,7 @@ class FontProcessor:
                     self.font.releaseHeldNotifications()
         else:
             print(f"[{datetime.datetime.now()}] Starting sequential conversion...")
-            init_worker(self.round_size)
+            init_worker(self.round_size, self.effect_params)
             self.font.holdNotifications()
             try:
                 for name in tqdm.tqdm(target_names, desc="Processing"):
@@ -133,50 +314,357 @@ class FontProcessor:
                     self._apply_glyph_data(self.font[name], res)
             finally:
                 self.font.releaseHeldNotifications()
+        self.timings["effects"] = time.perf_counter() - start
+        self._report_simplify_stats()
+        self._report_issues()
+
+    def _process_threaded(self, target_names, max_workers=None):
+        """スレッドプールでエフェクトを適用する
+
+        エフェクトのインスタンスは全スレッドで共有し（apply は状態を持たない）、
+        グリフデータは pickle せずにスレッド間で受け渡す。defcon のフォントは
+        スレッドセーフではないため、グリフの読み出しと書き戻しだけをロックで直列化し、
+        各スレッドが自分の結果をその場で書き戻す。通知は呼び出し中ずっと保留する。
+        """
+        import sys
+        import tqdm
+        gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+        print(f"[{datetime.datetime.now()}] Starting threaded conversion (GIL {'enabled' if gil else 'disabled'})...")
+        effects = create_effects(self.round_size, self.effect_params)
+        font_lock = threading.Lock()
+
+        def work(name):
+            if self.store is not None:
+                # ストアの読み出しは mmap の参照だけなのでロック不要
+                data = self.store.glyph_data(self.store.index[name])
+            else:
+                with font_lock:
+                    data = self._extract_glyph_data(self.font[name])
+            res = apply_effects(effects, data)
+            with font_lock:
+                self._apply_glyph_data(self.font[name], res)
+
+        self.font.holdNotifications()
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for _ in tqdm.tqdm(executor.map(work, target_names), total=len(target_names), desc="Processing"):
+                    pass
+        finally:
+            self.font.releaseHeldNotifications()
+
+    def process_distributed(self, address, authkey, subset_glyphs=None, shard_size=200, local_workers=0,
+                            shard_timeout=300, max_retries=3, local_only=False):
+        """TCP で接続してきたワーカー（他のホスト）にグリフを分配して処理する
+
+        Args:
+            address: 待ち受けるアドレス (host, port)。port 0 なら空いているポートを使う
+            authkey: ワーカーと共有する鍵（bytes）
+            shard_size: 1回に渡すグリフ数
+            local_workers: 同じホストで起動するワーカープロセスの数（試験やホスト自身の計算資源に）
+            shard_timeout: この秒数以内に結果が返らなければワーカーを切り離す
+            max_retries: 1つのシャードを配り直す最大回数
+            local_only: リモートのワーカーが接続できない（使い捨ての鍵）。ローカルのワーカーが
+                すべて終了したら待たずに RuntimeError を送出する
+        """
+        import tqdm
+        from distributed import Coordinator, start_local_workers
+        start = time.perf_counter()
+        target_names = self._collect_target_names(subset_glyphs)
+        self.issues = {}
+
+        print(f"[{datetime.datetime.now()}] Extracting {len(target_names)} glyphs into shards of {shard_size}...")
+        shards = []
+        for i in range(0, len(target_names), shard_size):
+            shards.append([self._extract_glyph_data(self.font[name]) for name in target_names[i:i + shard_size]])
+
+        coordinator = Coordinator(address, authkey, (self.round_size, self.effect_params),
+                                  shard_timeout=shard_timeout, max_retries=max_retries)
+        host, port = coordinator.address
+        print(f"[{datetime.datetime.now()}] Coordinator listening on {host}:{port} ({len(shards)} shards)...")
+        procs = start_local_workers(coordinator.address, authkey, local_workers) if local_workers else []
+        try:
+            # 結果はシャード単位で順不同に届くので、届いたものから反映する
+            self.font.holdNotifications()
+            try:
+                with tqdm.tqdm(total=len(target_names), desc="Processing") as progress:
+                    for _, results in coordinator.map(shards, local_procs=procs if local_only else None):
+                        for res in results:
+                            self._apply_glyph_data(self.font[res['name']], res)
+                        progress.update(len(results))
+            finally:
+                self.font.releaseHeldNotifications()
+        finally:
+            coordinator.close()
+            for proc in procs:
+                proc.join(timeout=5)
+        self.timings["effects"] = time.perf_counter() - start
+        self._report_simplify_stats()
+        self._report_issues()
+
+    def process_sweep(self, variant_params, use_parallel=True, max_workers=None, subset_glyphs=None):
+        """パラメータの組み合わせごとにグリフを処理する（抽出は一度だけ）
+
+        すべての組み合わせを同じワーカープールで処理し、
+        1バリアント分の結果が揃うたびに self.font へ反映してその番号を yield する。
+        呼び出し側は yield の直後に save_otf で書き出すこと（次のバリアントで上書きされる）。
+        結果が溜まりすぎないよう、先行して投入するのは次の1バリアントまでに留める。
+        self.timings["effects"] にはそのバリアントの結果を待って反映した時間が入る
+        （共通の抽出時間は含まない）。
+
+        Args:
+            variant_params: create_effects に渡す effect_params のリスト
+        """
+        import tqdm
+        target_names = self._collect_target_names(subset_glyphs)
+        total_targets = len(target_names)
+        variant_params = [{**self.effect_params, **params} for params in variant_params]
+
+        print(f"[{datetime.datetime.now()}] Extracting {total_targets} glyphs once for {len(variant_params)} variants...")
+        base_data = [self._extract_glyph_data(self.font[name]) for name in target_names]
+
+        if use_parallel:
+            print(f"[{datetime.datetime.now()}] Starting parallel sweep ({len(variant_params)} variants)...")
+            chunk_size = 100
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=get_worker_context(),
+                initializer=init_variant_worker,
+                initargs=(self.round_size, variant_params)
+            ) as executor:
+                def submit(index):
+                    # map はこの時点で1バリアント分のジョブをすべて投入する
+                    jobs = ((index, data) for data in base_data)
+                    return executor.map(process_variant_worker, jobs, chunksize=chunk_size)
+
+                try:
+                    next_results = submit(0)
+                    for index in range(len(variant_params)):
+                        # 呼び出し側が保存している間に、次のバリアントだけを処理させておく
+                        results_iter = next_results
+                        next_results = submit(index + 1) if index + 1 < len(variant_params) else None
+                        start = time.perf_counter()
+                        self.issues = {}
+                        self.font.holdNotifications()
+                        try:
+                            for _, res in tqdm.tqdm(results_iter, total=total_targets,
+                                                    desc=f"Variant {index + 1}/{len(variant_params)}"):
+                                self._apply_glyph_data(self.font[res['name']], res)
+                        finally:
+                            self.font.releaseHeldNotifications()
+                        self.timings["effects"] = time.perf_counter() - start
+                        self._report_simplify_stats()
+                        self._report_issues()
+                        yield index
+                finally:
+                    # 途中で閉じられたら、まだ始まっていないジョブを待たずに取り消す
+                    executor.shutdown(wait=True, cancel_futures=True)
+        else:
+            print(f"[{datetime.datetime.now()}] Starting sequential sweep ({len(variant_params)} variants)...")
+            init_variant_worker(self.round_size, variant_params)
+            for index in range(len(variant_params)):
+                start = time.perf_counter()
+                self.issues = {}
+                self.font.holdNotifications()
+                try:
+                    for data in tqdm.tqdm(base_data, desc=f"Variant {index + 1}/{len(variant_params)}"):
+                        _, res = process_variant_worker((index, copy.deepcopy(data)))
+                        self._apply_glyph_data(self.font[res['name']], res)
+                finally:
+                    self.font.releaseHeldNotifications()
+                self.timings["effects"] = time.perf_counter() - start
+                self._report_simplify_stats()
+                self._report_issues()
+                yield index
+
+    def _report_simplify_stats(self):
+        """簡略化で削減した点数とチャーストリング長（サブルーチン化前）を表示してリセットする"""
+        points_before, points_after, bytes_before, bytes_after = self.simplify_stats
+        self.simplify_stats = [0, 0, 0, 0]
+        if not points_before:
+            return
+        print(f"[{datetime.datetime.now()}] Simplified outlines: "
+              f"points {points_before} -> {points_after} (-{(points_before - points_after) / points_before:.1%}), "
+              f"charstrings {bytes_before} -> {bytes_after} bytes (-{(bytes_before - bytes_after) / max(bytes_before, 1):.1%})")
 
-    def save_otf(self, output_path, optimize_cff=True, subset_glyphs=None):
-        font_to_compile = self.font
+    def validation_errors(self):
+        """ビルドを止めるべき問題（ERROR_TYPES）のあるグリフ名のリスト"""
+        return sorted(name for name, issues in self.issues.items()
+                      if any(issue['type'] in ERROR_TYPES for issue in issues))
+
+    def _report_issues(self, limit=20):
+        """検査で見つかった問題を種類ごとに集計して表示する"""
+        if "OutlineValidator" not in self.effect_params:
+            return
+        if not self.issues:
+            print(f"[{datetime.datetime.now()}] Outline validation: no issues.")
+            return
+        counts = {}
+        for issues in self.issues.values():
+            for issue in issues:
+                counts[issue['type']] = counts.get(issue['type'], 0) + 1
+        summary = ", ".join(f"{kind} {count}" for kind, count in sorted(counts.items()))
+        print(f"[{datetime.datetime.now()}] Outline validation: {len(self.issues)} glyphs with issues ({summary})")
+        for name in sorted(self.issues)[:limit]:
+            details = "; ".join(
+                f"{issue['type']} (contour {issue['contour']}" + (f" at {issue['at']}" if 'at' in issue else "") + ")"
+                for issue in self.issues[name]
+            )
+            print(f"    {name}: {details}")
+        if len(self.issues) > limit:
+            print(f"    ... and {len(self.issues) - limit} more")
+
+    def _prepare_features(self, font):
+        """features.fea を一度だけ解析し、aalt の script/language 文を AST 上で除去する"""
+        text = font.features.text
+        if self._features_doc is not None and self._features_doc[0] == text:
+            return self._features_doc[1]
+
+        from layout_cache import parse_features, sanitize_aalt
+        print(f"[{datetime.datetime.now()}] Parsing features.fea...")
+        doc = parse_features(font)
+        if sanitize_aalt(doc):
+            print(f"[{datetime.datetime.now()}] Sanitized features.fea (removed script/language from aalt).")
+            font.features.text = doc.asFea()
+        self._features_doc = (font.features.text, doc)
+        return doc
+
+    def _font_to_compile(self, subset_glyphs=None):
+        """コンパイルするフォント（サブセット指定時は必要なグリフだけを持つ最小限のフォント）"""
+        if not subset_glyphs:
+            return self.font
+        import defcon
+        print(f"[{datetime.datetime.now()}] Creating subset font for fast preview...")
+        # 最小限のフォントを作成
+        subset_font = defcon.Font()
+        # メタデータのコピー
+        for attr in ['familyName', 'styleName', 'unitsPerEm', 'ascender', 'descender', 'xHeight', 'capHeight']:
+            val = getattr(self.font.info, attr)
+            if val is not None:
+                setattr(subset_font.info, attr, val)
         
-        if subset_glyphs:
-            print(f"[{datetime.datetime.now()}] Creating subset font for fast preview...")
-            # 最小限のフォントを作成
-            subset_font = defcon.Font()
-            # メタデータのコピー
-            for attr in ['familyName', 'styleName', 'unitsPerEm', 'ascender', 'descender', 'xHeight', 'capHeight']:
-                val = getattr(self.font.info, attr)
-                if val is not None:
-                    setattr(subset_font.info, attr, val)
-            
-            # 必要なグリフのコピー (.notdef は必須、サブセット時はフィーチャーは無視)
-            needed = set(subset_glyphs) | {".notdef", "space"}
-            for name in needed:
-                if name in self.font:
-                    subset_font.insertGlyph(self.font[name], name=name)
-            
-            font_to_compile = subset_font
+        # 必要なグリフのコピー (.notdef は必須、サブセット時はフィーチャーは無視)
+        for name in self._output_glyph_names(subset_glyphs):
+            subset_font.insertGlyph(self.font[name], name=name)
+        return subset_font
+
+    def _output_glyph_names(self, subset_glyphs=None):
+        """出力に含まれるグリフ名"""
+        if not subset_glyphs:
+            return list(self.font.keys())
+        needed = set(subset_glyphs) | {".notdef", "space"}
+        return [name for name in needed if name in self.font]
 
+    def _compile_kwargs(self, font_to_compile, layout_cache_dir=None):
+        from layout_cache import LayoutCache, is_cacheable
+        compile_kwargs = {}
         if font_to_compile.features.text:
-            print(f"[{datetime.datetime.now()}] Sanitizing features.fea (fixing aalt script errors)...")
-            def sanitize_aalt(match):
-                block = match.group(0)
-                sub_block = re.sub(r'^\s*(script|language)\s+[^;]+;\s*$', '', block, flags=re.MULTILINE)
-                return sub_block
-            
-            new_text = re.sub(r'feature aalt\s*\{.*?\}\s*aalt\s*;', sanitize_aalt, font_to_compile.features.text, flags=re.DOTALL)
-            font_to_compile.features.text = new_text
+            doc = self._prepare_features(font_to_compile)
+            if layout_cache_dir and is_cacheable(doc):
+                compile_kwargs["featureCompilerClass"] = LayoutCache(layout_cache_dir).make_compiler_class(doc)
+        return compile_kwargs
+
+    def _report_timings(self, flavor):
+        """工程ごとの所要時間を CFF2 / TrueType で同じ形式で表示する"""
+        steps = ", ".join(f"{step} {seconds:.2f}s" for step, seconds in self.timings.items())
+        total = sum(self.timings.values())
+        print(f"[{datetime.datetime.now()}] Timings ({flavor}): {steps} (total {total:.2f}s)")
+
+    def save_otf(self, output_path, optimize_cff=True, subset_glyphs=None, layout_cache_dir=None):
+        import ufo2ft
+        font_to_compile = self._font_to_compile(subset_glyphs)
+        compile_kwargs = self._compile_kwargs(font_to_compile, layout_cache_dir)
 
         print(f"[{datetime.datetime.now()}] Compiling OTF (CFFVersion: 2, Optimize: {optimize_cff})...")
+        start = time.perf_counter()
         # ufo2ftの内部でcffsubrが走る前にpost形式を3.0にする必要があるため、一旦最適化オフでコンパイル
-        otf = ufo2ft.compileOTF(font_to_compile, optimizeCFF=False, cffVersion=2)
+        otf = ufo2ft.compileOTF(font_to_compile, optimizeCFF=False, cffVersion=2, **compile_kwargs)
         
         # post形式 2.0 (デフォルト) はインデックス溢れで保存できないため 3.0 (名前なし) に変更
         otf["post"].formatType = 3.0
+        self.timings["compile"] = time.perf_counter() - start
 
         if optimize_cff:
             import cffsubr
             print(f"[{datetime.datetime.now()}] Subroutinizing CFF2 (this will take a few minutes for 65k glyphs)...")
+            start = time.perf_counter()
             # 手動でサブルーチン化を実行（このとき内部でotf.saveが走るが、post=3.0なら通る）
             cffsubr.subroutinize(otf, cff_version=2)
+            self.timings["subroutinize"] = time.perf_counter() - start
         
+        start = time.perf_counter()
         otf.save(output_path)
+        self.timings["save"] = time.perf_counter() - start
+        print(f"[{datetime.datetime.now()}] Saved to {output_path}")
+        self._report_timings("CFF2")
+
+    def convert_to_quadratic(self, max_err=1.0, use_parallel=True, max_workers=None, subset_glyphs=None):
+        """出力される全グリフの輪郭を quadratic 曲線に変換する（エフェクト適用後に呼ぶ）
+
+        Args:
+            max_err: 変換の許容誤差（ユニット）。全ウエイトで同じ値を使うこと
+        """
+        import tqdm
+        start = time.perf_counter()
+        # スイープでは2回目以降、エフェクトで書き換えたグリフだけを変換する
+        names = [name for name in self._output_glyph_names(subset_glyphs)
+                 if name not in self._quadratic_names and len(self.font[name])]
+        print(f"[{datetime.datetime.now()}] Converting {len(names)} glyphs to quadratic curves (max error {max_err})...")
+
+        def data_generator():
+            for name in names:
+                yield self._extract_glyph_data(self.font[name])
+
+        def apply(res):
+            # コンポーネントは残し、輪郭だけを書き換える
+            glyph = self.font[res['name']]
+            glyph.clearContours()
+            pen = glyph.getPointPen()
+            for c_data in res['contours']:
+                pen.beginPath()
+                for p in c_data['points']:
+                    pen.addPoint((p['x'], p['y']), segmentType=p['segmentType'], smooth=p['smooth'])
+                pen.endPath()
+            self._quadratic_names.add(res['name'])
+
+        self.font.holdNotifications()
+        try:
+            if use_parallel:
+                with ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=get_worker_context(),
+                    initializer=init_quadratic_worker,
+                    initargs=(max_err,)
+                ) as executor:
+                    results_iter = executor.map(process_quadratic_worker, data_generator(), chunksize=100)
+                    for res in tqdm.tqdm(results_iter, total=len(names), desc="Quadratic"):
+                        apply(res)
+            else:
+                init_quadratic_worker(max_err)
+                for data in tqdm.tqdm(data_generator(), total=len(names), desc="Quadratic"):
+                    apply(process_quadratic_worker(data))
+        finally:
+            self.font.releaseHeldNotifications()
+        self.timings["quadratic"] = time.perf_counter() - start
+
+    def save_ttf(self, output_path, optimize=True, subset_glyphs=None, layout_cache_dir=None):
+        """TrueType (glyf) 形式で保存する（convert_to_quadratic の後に呼ぶ）
+
+        変換と輪郭の反転はワーカーで済んでいるので、ufo2ft では glyf/loca の組み立てだけを行う。
+        """
+        import ufo2ft
+        font_to_compile = self._font_to_compile(subset_glyphs)
+        compile_kwargs = self._compile_kwargs(font_to_compile, layout_cache_dir)
+
+        print(f"[{datetime.datetime.now()}] Compiling TTF (Optimize: {optimize})...")
+        start = time.perf_counter()
+        ttf = ufo2ft.compileTTF(font_to_compile, convertCubics=False, reverseDirection=False,
+                                dropImpliedOnCurves=optimize, **compile_kwargs)
+        # OTF と同じく post 形式 2.0 ではグリフ名が溢れるため 3.0 にする
+        ttf["post"].formatType = 3.0
+        self.timings["compile"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ttf.save(output_path)
+        self.timings["save"] = time.perf_counter() - start
         print(f"[{datetime.datetime.now()}] Saved to {output_path}")
+        self._report_timings("TrueType")
@@ -1,10 +1,16 @@
 import os
-import subprocess
+import json
+import shutil
+import hashlib
 import requests
 import argparse
+import multiprocessing
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 BASE_URL = "https://github.com/notofonts/noto-cjk/raw/main/Serif/OTF/Japanese/"
+# 取得元とハッシュを固定したマニフェスト（リポジトリに含める）
+DEFAULT_MANIFEST = Path(__file__).with_name("assets_manifest.json")
 WEIGHTS = [
     "Black",
     "Bold",
@@ -14,47 +20,242 @@ WEIGHTS = [
     "Regular",
     "SemiBold"
 ]
+CHUNK_SIZE = 1024 * 1024
 
-def download_font(weight, output_dir):
+class ChecksumError(Exception):
+    """ダウンロードしたファイルのSHA-256がマニフェストと一致しない"""
+
+class IncompleteDownloadError(Exception):
+    """ダウンロードしたファイルのサイズがサーバーの報告と一致しない"""
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_manifest(manifest_path):
+    """{"base_url": 取得元, "files": {ファイル名: sha256}} 形式のマニフェストを読み込む（なければ空）
+
+    以前の {ファイル名: sha256} だけの形式も読み込める。
+    """
+    manifest = {"files": {}}
+    if manifest_path.exists():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        manifest.update(data if "files" in data else {"files": data})
+    return manifest
+
+def save_manifest(manifest_path, manifest):
+    tmp_path = manifest_path.with_suffix(manifest_path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, manifest_path)
+
+def load_part_validator(meta_path):
+    """`.part` を取得したときの ETag / Last-Modified を読み込む（なければ None）"""
+    if meta_path.exists():
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("validator")
+    return None
+
+def response_total_size(response):
+    """レスポンスから完全なファイルのサイズを求める（不明なら None）"""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    if response.status_code == 200 and length and length.isdigit():
+        return int(length)
+    return None
+
+def download_font(weight, output_dir, base_url=BASE_URL, expected_sha256=None, force=False):
+    """フォントをダウンロードし、(パス, SHA-256, 今回ダウンロードしたか) を返す
+
+    途中までの `.part` ファイルがあれば、取得時の ETag（なければ Last-Modified）を
+    If-Range に付けて HTTP Range で続きから取得する。サーバー上のファイルが変わっていれば
+    サーバーは全体を返すので、異なる版のバイト列が継ぎ合わされることはない。
+    expected_sha256 が指定されていれば検証し、一致しなければ ChecksumError を送出する。
+    指定がなければサイズをサーバーの報告と照合し、一致しなければ IncompleteDownloadError を送出する。
+    """
     filename = f"NotoSerifCJKjp-{weight}.otf"
-    url = f"{BASE_URL}{filename}"
+    url = f"{base_url}{filename}"
     output_path = output_dir / f"NotoSerifJP-{weight}.otf"
-    
+    part_path = output_path.with_suffix(".otf.part")
+    meta_path = output_path.with_suffix(".otf.part.json")
+
+    if force:
+        output_path.unlink(missing_ok=True)
+        part_path.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+
     if output_path.exists():
-        print(f"Skipping download: {output_path} already exists.")
-        return output_path
-
-    print(f"Downloading {filename} from {url}...")
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    
-    with open(output_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-    
+        digest = sha256_file(output_path)
+        if expected_sha256 is None or digest == expected_sha256:
+            print(f"Skipping download: {output_path} already exists.")
+            return output_path, digest, False
+        print(f"Checksum mismatch for existing {output_path}, downloading again...")
+        output_path.unlink()
+
+    validator = load_part_validator(meta_path)
+    offset = part_path.stat().st_size if part_path.exists() and validator else 0
+    headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+
+    print(f"Downloading {filename} from {url}" + (f" (resuming at {offset} bytes)..." if offset else "..."))
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        if offset and response.status_code == 416:
+            # If-Range が一致した上で範囲外なので、既に全体を取得済み
+            total = response_total_size(response)
+        else:
+            response.raise_for_status()
+            total = response_total_size(response)
+            # If-Range が一致しない・Range 非対応なら 200 で全体が返るので最初から書き直す
+            mode = "ab" if offset and response.status_code == 206 else "wb"
+            if mode == "wb":
+                validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                if validator:
+                    with open(meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"url": url, "validator": validator}, f)
+                else:
+                    meta_path.unlink(missing_ok=True)
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+
+    digest = sha256_file(part_path)
+    if expected_sha256 is not None:
+        if digest != expected_sha256:
+            part_path.unlink()
+            meta_path.unlink(missing_ok=True)
+            raise ChecksumError(f"{filename}: expected sha256 {expected_sha256}, got {digest}")
+    else:
+        size = part_path.stat().st_size
+        if total is None or size != total:
+            # 途中で切れただけなら .part を残して次回続きから取得する
+            raise IncompleteDownloadError(f"{filename}: got {size} bytes, server reported {total}")
+
+    os.replace(part_path, output_path)
+    meta_path.unlink(missing_ok=True)
     print(f"Successfully downloaded to {output_path}")
-    return output_path
+    return output_path, digest, True
+
+def extract_ufo(font_path, force=False, glyph_store=False):
+    """OTF から UFO を抽出する（ワーカープロセスで実行される）
+
+    glyph_store が True なら、同じ内容のバイナリグリフストア（.otf.ntgs）も書き出す。
+    """
+    import defcon
+    import extractor
 
-def extract_ufo(font_path):
     ufo_path = font_path.with_suffix(".otf.ufo")
-    if ufo_path.exists():
+    store_path = font_path.with_suffix(".otf.ntgs")
+    ufo = None
+    if ufo_path.exists() and not force:
         print(f"Skipping extraction: {ufo_path} already exists.")
-        return
-
-    print(f"Extracting UFO from {font_path}...")
-    try:
-        subprocess.run(
-            ["uv", "run", "extractufo", "-m", "defcon", str(font_path)],
-            check=True
-        )
+    else:
+        if ufo_path.exists():
+            shutil.rmtree(ufo_path)
+        print(f"Extracting UFO from {font_path}...")
+        ufo = defcon.Font()
+        extractor.extractUFO(str(font_path), ufo)
+        ufo.save(str(ufo_path))
         print(f"Successfully extracted to {ufo_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error during extraction of {font_path}: {e}")
+
+    if glyph_store:
+        if store_path.exists() and not force and ufo is None:
+            print(f"Skipping glyph store: {store_path} already exists.")
+        else:
+            from glyph_store import write_store
+            if ufo is None:
+                ufo = defcon.Font(path=str(ufo_path))
+            write_store(ufo, store_path)
+            print(f"Successfully wrote glyph store to {store_path}")
+    return ufo_path
+
+def setup(output_dir, weights=WEIGHTS, base_url=None, manifest_path=None,
+          download_workers=4, extract_workers=2, force=False, skip_extract=False, glyph_store=False,
+          trust_on_first_use=False):
+    """全ウエイトを並列にダウンロードし、完了したものから順にUFOを抽出する
+
+    ダウンロードしたファイルはマニフェストの SHA-256 と照合する。マニフェストに記録のない
+    ファイルは失敗として扱う。trust_on_first_use が True のときだけ、それらをダウンロードし、
+    検証済みのダウンロードと抽出がどちらも成功したときにハッシュを記録する。
+    base_url を省略するとマニフェストの取得元（なければ BASE_URL）を使う。
+
+    抽出はダウンロードのスレッドが動いている間にプロセスを起動するので、
+    fork ではなく forkserver（使えなければ spawn）で起動する。
+
+    Returns:
+        List[str]: 失敗したウエイト
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = Path(manifest_path) if manifest_path else DEFAULT_MANIFEST
+    manifest = load_manifest(manifest_path)
+    base_url = base_url or manifest.get("base_url") or BASE_URL
+    recorded = False
+
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    mp_context = multiprocessing.get_context(start_method)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=extract_workers, mp_context=mp_context) as extractions:
+        download_futures = {}
+        for weight in weights:
+            expected = manifest["files"].get(f"NotoSerifCJKjp-{weight}.otf")
+            if expected is None and not trust_on_first_use:
+                print(f"Not pinned: NotoSerifCJKjp-{weight}.otf has no SHA-256 in {manifest_path} "
+                      f"(use --trust-on-first-use to record it)")
+                failed.append(weight)
+                continue
+            future = downloads.submit(download_font, weight, output_dir, base_url, expected, force)
+            download_futures[future] = weight
+
+        extract_futures = {}
+        for future in as_completed(download_futures):
+            weight = download_futures[future]
+            try:
+                font_path, digest, downloaded = future.result()
+            except Exception as e:
+                print(f"Failed to download {weight}: {e}")
+                failed.append(weight)
+                continue
+            # 既存ファイルのハッシュは検証済みとは限らないので記録しない
+            record = digest if downloaded else None
+            if skip_extract:
+                if record:
+                    manifest["files"].setdefault(f"NotoSerifCJKjp-{weight}.otf", record)
+                    recorded = True
+            else:
+                future = extractions.submit(extract_ufo, font_path, force, glyph_store)
+                extract_futures[future] = (weight, record)
+
+        for future in as_completed(extract_futures):
+            weight, record = extract_futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error during extraction of {weight}: {e}")
+                failed.append(weight)
+                continue
+            if record:
+                manifest["files"].setdefault(f"NotoSerifCJKjp-{weight}.otf", record)
+                recorded = True
+
+    if recorded:
+        # 記録したハッシュはこの取得元のもの
+        manifest.setdefault("base_url", base_url)
+        save_manifest(manifest_path, manifest)
+    return failed
 
 def main():
     parser = argparse.ArgumentParser(description="Setup font assets for NType-JP.")
     parser.add_argument(
-        "--output-dir", 
+        "--output-dir",
         default="static",
         help="Directory to store fonts and UFOs (default: static)"
     )
@@ -63,18 +264,65 @@ def main():
         action="store_true",
         help="Force download and extraction even if files exist"
     )
-    
+    parser.add_argument(
+        "--base-url",
+        help="URL prefix to download the OTFs from (default: the manifest's base_url)"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="JSON file with the base URL and the SHA-256 of each OTF (default: src/assets_manifest.json)"
+    )
+    parser.add_argument(
+        "--trust-on-first-use",
+        action="store_true",
+        help="Download OTFs missing from the manifest and record their SHA-256 in it"
+    )
+    parser.add_argument(
+        "--weights",
+        help="Comma separated weights to set up (default: all)"
+    )
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="Number of concurrent downloads (default: 4)"
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=max(1, (os.cpu_count() or 1) // 2),
+        help="Number of UFO extraction processes (default: half of cores)"
+    )
+    parser.add_argument(
+        "--skip-extract",
+        action="store_true",
+        help="Only download and verify the OTFs"
+    )
+    parser.add_argument(
+        "--glyph-store",
+        action="store_true",
+        help="Also write a memory-mapped binary glyph store (.otf.ntgs) next to each UFO"
+    )
+
     args = parser.parse_args()
-    output_dir = Path(args.output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    weights = args.weights.split(",") if args.weights else WEIGHTS
 
-    for weight in WEIGHTS:
-        try:
-            font_path = download_font(weight, output_dir)
-            extract_ufo(font_path)
-        except Exception as e:
-            print(f"Failed to process {weight}: {e}")
+    failed = setup(
+        args.output_dir,
+        weights=weights,
+        base_url=args.base_url,
+        manifest_path=args.manifest,
+        download_workers=args.download_workers,
+        extract_workers=args.extract_workers,
+        force=args.force,
+        skip_extract=args.skip_extract,
+        glyph_store=args.glyph_store,
+        trust_on_first_use=args.trust_on_first_use
+    )
 
+    if failed:
+        print(f"\nSetup finished with errors: {', '.join(sorted(failed))}")
+        raise SystemExit(1)
     print("\nSetup complete!")
 
 if __name__ == "__main__":
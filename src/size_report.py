@@ -0,0 +1,175 @@
+import io
+import os
+import json
+import datetime
+import numpy as np
+from fontTools.ttLib import TTFont
+
+
+class SizeBudgetExceeded(Exception):
+    """出力サイズが --size-budget を超えた"""
+
+
+def parse_size(text):
+    """'5M', '800K', '1200000' のようなサイズ指定をバイト数に変換する"""
+    text = str(text).strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _index_lengths(index):
+    """cffLib の Index の各要素のバイト数（ファイルから読んだオフセットの差分）"""
+    offsets = getattr(index, "offsets", None)
+    if offsets:
+        return np.diff(np.asarray(offsets, dtype=np.int64))
+    return np.zeros(0, dtype=np.int64)
+
+
+def _woff2_size(otf):
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return None
+    buf = io.BytesIO()
+    otf.flavor = "woff2"
+    try:
+        otf.save(buf, reorderTables=False)
+    finally:
+        otf.flavor = None
+    return len(buf.getvalue())
+
+
+def build_report(font_path, top_n=20):
+    """ビルド済みフォントのサイズ内訳を辞書で返す"""
+    otf = TTFont(font_path)
+    report = {
+        "font": os.path.basename(font_path),
+        "created": datetime.datetime.now().astimezone().isoformat(),
+        "file_size": os.path.getsize(font_path),
+        "tables": {tag: otf.reader.tables[tag].length for tag in sorted(otf.reader.keys())},
+    }
+
+    cff_tag = "CFF2" if "CFF2" in otf else ("CFF " if "CFF " in otf else None)
+    if cff_tag:
+        cff = otf[cff_tag].cff
+        top = cff.topDictIndex[0]
+        char_strings = top.CharStrings
+        glyph_order = otf.getGlyphOrder()
+        lengths = _index_lengths(char_strings.charStringsIndex)
+
+        order = np.argsort(lengths)[::-1][:top_n]
+        report["charstrings"] = {
+            "glyphs": int(len(lengths)),
+            "total_bytes": int(lengths.sum()),
+            "mean_bytes": float(lengths.mean()) if len(lengths) else 0.0,
+            "top": [[glyph_order[i], int(lengths[i])] for i in order],
+        }
+
+        # サブルーチンの呼び出し回数を数える（チャーストリングを逆コンパイルする）
+        local_calls = 0
+        global_calls = 0
+        for name in glyph_order:
+            cs = char_strings[name]
+            cs.decompile()
+            for token in cs.program:
+                if token == "callsubr":
+                    local_calls += 1
+                elif token == "callgsubr":
+                    global_calls += 1
+
+        local_lengths = []
+        fd_array = getattr(top, "FDArray", None)
+        privates = [fd.Private for fd in fd_array] if fd_array is not None else [top.Private]
+        for private in privates:
+            subrs = getattr(private, "Subrs", None)
+            if subrs is not None:
+                local_lengths.append(_index_lengths(subrs))
+        local_lengths = np.concatenate(local_lengths) if local_lengths else np.zeros(0, dtype=np.int64)
+        global_lengths = _index_lengths(cff.GlobalSubrs)
+
+        report["subroutines"] = {
+            "local": {"count": int(len(local_lengths)), "bytes": int(local_lengths.sum()), "calls": local_calls},
+            "global": {"count": int(len(global_lengths)), "bytes": int(global_lengths.sum()), "calls": global_calls},
+        }
+
+    report["woff2_size"] = _woff2_size(otf)
+    return report
+
+
+def diff_reports(old, new):
+    """2つのレポートの差分（new - old）を返す"""
+    tables = {}
+    for tag in sorted(set(old["tables"]) | set(new["tables"])):
+        delta = new["tables"].get(tag, 0) - old["tables"].get(tag, 0)
+        if delta:
+            tables[tag] = delta
+    diff = {
+        "baseline": old["font"],
+        "file_size": new["file_size"] - old["file_size"],
+        "tables": tables,
+    }
+    if new.get("woff2_size") is not None and old.get("woff2_size") is not None:
+        diff["woff2_size"] = new["woff2_size"] - old["woff2_size"]
+    if "charstrings" in new and "charstrings" in old:
+        diff["charstring_bytes"] = new["charstrings"]["total_bytes"] - old["charstrings"]["total_bytes"]
+    return diff
+
+
+def _fmt_delta(delta):
+    return f"{delta:+,}"
+
+
+def print_report(report):
+    print(f"[{datetime.datetime.now()}] Size report for {report['font']}: {report['file_size']:,} bytes"
+          + (f" (WOFF2 {report['woff2_size']:,} bytes)" if report.get("woff2_size") is not None else ""))
+    for tag, length in sorted(report["tables"].items(), key=lambda kv: -kv[1]):
+        print(f"    {tag:<6}{length:>12,}  {length / report['file_size']:6.1%}")
+    if "charstrings" in report:
+        cs = report["charstrings"]
+        print(f"  CharStrings: {cs['total_bytes']:,} bytes in {cs['glyphs']:,} glyphs (mean {cs['mean_bytes']:.1f})")
+        for name, length in cs["top"]:
+            print(f"    {name:<24}{length:>8,}")
+    if "subroutines" in report:
+        for kind in ("local", "global"):
+            s = report["subroutines"][kind]
+            print(f"  {kind.capitalize()} subrs: {s['count']:,} ({s['bytes']:,} bytes), {s['calls']:,} calls")
+    if "diff" in report:
+        d = report["diff"]
+        print(f"  Compared with {d['baseline']}: file {_fmt_delta(d['file_size'])} bytes"
+              + (f", WOFF2 {_fmt_delta(d['woff2_size'])}" if "woff2_size" in d else "")
+              + (f", charstrings {_fmt_delta(d['charstring_bytes'])}" if "charstring_bytes" in d else ""))
+        for tag, delta in d["tables"].items():
+            print(f"    {tag:<6}{_fmt_delta(delta):>12}")
+
+
+def write_report(font_path, baseline_path=None, size_budget=None, top_n=20):
+    """サイズレポートを `<フォント>.size.json` に保存して表示する
+
+    baseline_path に以前のレポートを渡すと差分も記録する。
+    size_budget（バイト）を超えた場合は SizeBudgetExceeded を送出する。
+    """
+    report = build_report(font_path, top_n=top_n)
+    if baseline_path:
+        if os.path.exists(baseline_path):
+            with open(baseline_path, "r", encoding="utf-8") as f:
+                report["diff"] = diff_reports(json.load(f), report)
+        else:
+            print(f"Warning: Baseline report not found: {baseline_path}")
+    if size_budget is not None:
+        report["size_budget"] = size_budget
+
+    report_path = os.path.splitext(font_path)[0] + ".size.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print_report(report)
+    print(f"[{datetime.datetime.now()}] Size report saved to {report_path}")
+
+    if size_budget is not None and report["file_size"] > size_budget:
+        raise SizeBudgetExceeded(
+            f"{report['font']} is {report['file_size']:,} bytes, "
+            f"over the size budget of {size_budget:,} bytes by {report['file_size'] - size_budget:,}"
+        )
+    return report
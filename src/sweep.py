@@ -0,0 +1,59 @@
+import inspect
+import itertools
+from processor import EFFECT_CLASSES, OUTLINE_NEUTRAL_EFFECTS
+
+def _parse_value(text):
+    """スイープ値を int / float として解釈する"""
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def parse_sweep_spec(spec):
+    """`Effect.param=v1,v2,...` 形式の指定を解析する
+
+    Returns:
+        Tuple[str, str, List]: (エフェクトのクラス名, 引数名, 値のリスト)
+    """
+    try:
+        target, values = spec.split("=", 1)
+        cls_name, param = target.split(".", 1)
+    except ValueError:
+        raise ValueError(f"Invalid sweep spec (expected Effect.param=v1,v2,...): {spec}")
+
+    if cls_name not in EFFECT_CLASSES:
+        available = [name for name in EFFECT_CLASSES if name not in OUTLINE_NEUTRAL_EFFECTS]
+        raise ValueError(f"Unknown effect in sweep spec: {cls_name} (available: {', '.join(available)})")
+    if cls_name in OUTLINE_NEUTRAL_EFFECTS:
+        # 出力が同じで名前だけ違うフォントができてしまう
+        raise ValueError(f"{cls_name} does not change the outlines and cannot be swept")
+    accepted = inspect.signature(EFFECT_CLASSES[cls_name].__init__).parameters
+    if param not in accepted or param == "self":
+        raise ValueError(f"{cls_name} has no parameter '{param}'")
+
+    parsed = [_parse_value(v.strip()) for v in values.split(",") if v.strip()]
+    if not parsed:
+        raise ValueError(f"No values given in sweep spec: {spec}")
+    return cls_name, param, parsed
+
+def expand_sweep_grid(specs):
+    """スイープ指定の直積を展開する
+
+    ラベルは長いのでファイル名にだけ使い、スタイル名には短い番号（v01, v02, ...）を使う
+    （PostScript 名は 63 文字まで）。
+
+    Returns:
+        List[Tuple[str, str, Dict]]: (ファイル名用ラベル, スタイル名用の番号, effect_params) のリスト
+    """
+    axes = [parse_sweep_spec(spec) for spec in specs]
+    combos = list(itertools.product(*[values for _, _, values in axes]))
+    width = max(2, len(str(len(combos))))
+    variants = []
+    for index, combo in enumerate(combos):
+        effect_params = {}
+        label_parts = []
+        for (cls_name, param, _), value in zip(axes, combo):
+            effect_params.setdefault(cls_name, {})[param] = value
+            label_parts.append(f"{cls_name}.{param}{value}")
+        variants.append(("_".join(label_parts), f"v{index + 1:0{width}d}", effect_params))
+    return variants
@@ -0,0 +1,235 @@
+import numpy as np
+from typing import List, Dict, Any
+from effects import GlyphEffect
+
+# コンパイル前にビルドを止める問題（それ以外は警告として報告のみ）
+ERROR_TYPES = {
+    "non_finite",
+    "degenerate_contour",
+    "zero_area",
+    "flipped_winding",
+    "offcurve_before_line",
+    "bad_curve_offcurves",
+    "self_intersection",
+}
+
+
+# 点の segmentType の数値コード
+OFF_CURVE, LINE, CURVE, QCURVE = 0, 1, 2, 3
+SEGMENT_CODES = {None: OFF_CURVE, "move": LINE, "line": LINE, "curve": CURVE, "qcurve": QCURVE}
+
+
+def _issue(kind, contour, at=None, **detail):
+    issue = {"type": kind, "contour": int(contour)}
+    if at is not None:
+        issue["at"] = [round(float(at[0]), 1), round(float(at[1]), 1)]
+    issue.update({key: value.item() if hasattr(value, "item") else value for key, value in detail.items()})
+    return issue
+
+
+def _segment_crossings(a, b, contour_ids, next_index):
+    """線分 a[i]-b[i] 同士の交差（同じ輪郭内、隣接しないもの）を求める
+
+    x 方向の区間でソートした索引から候補の組を作り（sort and sweep）、
+    y 方向の重なりと向きの符号で絞り込む。
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: 交差する線分の番号の組
+    """
+    xmin = np.minimum(a[:, 0], b[:, 0])
+    xmax = np.maximum(a[:, 0], b[:, 0])
+    order = np.argsort(xmin, kind="stable")
+    xmin_sorted = xmin[order]
+    hi = np.searchsorted(xmin_sorted, xmax[order], side="right")
+    counts = np.maximum(hi - np.arange(1, len(order) + 1), 0)
+    if counts.sum() == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    first = np.repeat(np.arange(len(order)), counts)
+    second = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first + 1
+    i, j = order[first], order[second]
+
+    keep = (contour_ids[i] == contour_ids[j]) & (next_index[i] != j) & (next_index[j] != i)
+    ymin = np.minimum(a[:, 1], b[:, 1])
+    ymax = np.maximum(a[:, 1], b[:, 1])
+    keep &= (ymin[i] <= ymax[j]) & (ymin[j] <= ymax[i])
+    i, j = i[keep], j[keep]
+
+    def orient(p, q, r):
+        return (q[:, 0] - p[:, 0]) * (r[:, 1] - p[:, 1]) - (q[:, 1] - p[:, 1]) * (r[:, 0] - p[:, 0])
+
+    d1 = orient(a[i], b[i], a[j])
+    d2 = orient(a[i], b[i], b[j])
+    d3 = orient(a[j], b[j], a[i])
+    d4 = orient(a[j], b[j], b[i])
+    # 端点で接するだけのもの・重なって平行なものは除く（真に交差するもののみ）
+    proper = (d1 * d2 < 0) & (d3 * d4 < 0)
+    return i[proper], j[proper]
+
+
+def validate_glyph(glyph_data: Dict[str, Any], min_area: float = 1.0, curve_steps: int = 8) -> List[Dict[str, Any]]:
+    """エフェクト適用後のグリフを検査し、問題のリストを返す
+
+    グリフの全輪郭の点を1つの配列にまとめ、輪郭ごとのループを使わずに検査する。
+
+    Args:
+        glyph_data: グリフ情報の辞書（輪郭の 'clockwise' は抽出時の向き）
+        min_area: これより面積の小さい輪郭を zero_area とする（平方ユニット）
+        curve_steps: 交差判定・面積計算で曲線を折れ線にする分割数
+
+    Returns:
+        List[Dict[str, Any]]: {'type', 'contour', 'at', ...} 形式の問題
+    """
+    issues = []
+    coords = []
+    codes = []
+    lengths = []
+    contour_indices = []
+    for ci, contour in enumerate(glyph_data['contours']):
+        pts = contour['points']
+        first_on = next((k for k, p in enumerate(pts) if p.get('segmentType') is not None), None)
+        if first_on is None or len(pts) < 3:
+            issues.append(_issue("degenerate_contour", ci, points=len(pts)))
+            continue
+        # 各輪郭がオンカーブ点から始まるように回転してまとめる
+        pts = pts[first_on:] + pts[:first_on]
+        coords.extend((p['x'], p['y']) for p in pts)
+        codes.extend(SEGMENT_CODES.get(p.get('segmentType'), LINE) for p in pts)
+        lengths.append(len(pts))
+        contour_indices.append(ci)
+    if not lengths:
+        return issues
+
+    xy = np.array(coords, dtype=float)
+    code = np.array(codes, dtype=np.int8)
+    lengths = np.array(lengths)
+    n_contours = len(lengths)
+    cid = np.repeat(np.arange(n_contours), lengths)
+    starts = np.cumsum(lengths) - lengths
+    ends = starts + lengths
+    excluded = np.zeros(n_contours, dtype=bool)
+
+    def report(kind, mask_by_contour, at_by_contour=None, **detail_by_contour):
+        for k in np.flatnonzero(mask_by_contour & ~excluded):
+            at = None if at_by_contour is None else at_by_contour[k]
+            issues.append(_issue(kind, contour_indices[k], at, **{key: v[k] for key, v in detail_by_contour.items()}))
+
+    finite = np.isfinite(xy).all(axis=1)
+    non_finite = np.bincount(cid, ~finite, minlength=n_contours).astype(int)
+    report("non_finite", non_finite > 0, count=non_finite)
+    excluded |= non_finite > 0
+    xy[~finite] = 0
+
+    # オンカーブ点ごとに、そこから始まるセグメントの終点と間のオフカーブ点の数を求める
+    on_idx = np.flatnonzero(code != OFF_CURVE)
+    on_cid = cid[on_idx]
+    last_in_contour = np.append(on_cid[1:] != on_cid[:-1], True)
+    next_on = np.where(last_in_contour, ends[on_cid], np.append(on_idx[1:], 0))
+    runs = next_on - on_idx - 1
+    end_pt = np.where(last_in_contour, starts[on_cid], next_on)
+    end_code = code[end_pt]
+
+    on_count = np.bincount(on_cid, minlength=n_contours)
+    report("degenerate_contour", on_count < 2, xy[starts], points=lengths)
+    excluded |= on_count < 2
+
+    # Normalizer で直しきれないオフカーブ点の並び
+    for kind, bad in (("offcurve_before_line", (end_code == LINE) & (runs > 0)),
+                      ("bad_curve_offcurves", (end_code == CURVE) & (runs > 2))):
+        for k in np.flatnonzero(bad & ~excluded[on_cid]):
+            issues.append(_issue(kind, contour_indices[on_cid[k]], xy[end_pt[k]], offcurves=int(runs[k])))
+        excluded[on_cid[bad]] = True
+    # オフカーブ点が 0〜1 個の curve は UFO として正しく、そのままコンパイルできる（警告のみ）
+    short = (end_code == CURVE) & (runs < 2)
+    for k in np.flatnonzero(short & ~excluded[on_cid]):
+        issues.append(_issue("short_curve_offcurves", contour_indices[on_cid[k]], xy[end_pt[k]], offcurves=int(runs[k])))
+    # 二次曲線の輪郭は形の検査の対象外
+    excluded[on_cid[end_code == QCURVE]] = True
+
+    # 重複したオンカーブ点（長さゼロの線分）
+    dup = (runs == 0) & (xy[on_idx] == xy[end_pt]).all(axis=1)
+    dup_count = np.bincount(on_cid, dup, minlength=n_contours).astype(int)
+    first_dup = np.full(n_contours, -1)
+    first_dup[on_cid[dup][::-1]] = on_idx[dup][::-1]
+    report("duplicate_point", dup_count > 0, xy[first_dup], count=dup_count)
+
+    # 残った輪郭を折れ線にする（cubic 曲線は Bernstein 行列で一括評価）
+    # オフカーブ点が 0 個の curve は直線、1 個のものは二次曲線を cubic に上げて扱う
+    seg = ~excluded[on_cid]
+    seg_start, seg_end, seg_cid, seg_runs = on_idx[seg], end_pt[seg], on_cid[seg], runs[seg]
+    is_curve = (end_code[seg] == CURVE) & (seg_runs > 0)
+    if not len(seg_start):
+        return issues
+    t = np.arange(1, curve_steps + 1) / curve_steps
+    mt = 1 - t
+    bernstein = np.stack([mt ** 3, 3 * mt * mt * t, 3 * mt * t * t, t ** 3], axis=1)  # (F, 4)
+    cs = seg_start[is_curve]
+    p0, p3 = xy[cs], xy[seg_end[is_curve]]
+    quadratic = (seg_runs[is_curve] == 1)[:, None]
+    p1 = np.where(quadratic, p0 + 2 / 3 * (xy[cs + 1] - p0), xy[cs + 1])
+    p2 = np.where(quadratic, p3 + 2 / 3 * (xy[cs + 1] - p3), xy[np.minimum(cs + 2, len(xy) - 1)])
+    ctrl = np.stack([p0, p1, p2, p3], axis=1)  # (M, 4, 2)
+
+    counts = np.where(is_curve, curve_steps, 1)
+    offsets = np.cumsum(counts) - counts
+    poly = np.empty((counts.sum(), 2))
+    poly[offsets[~is_curve]] = xy[seg_end[~is_curve]]
+    if len(cs):
+        poly[(offsets[is_curve][:, None] + np.arange(curve_steps)).ravel()] = \
+            np.einsum("fk,mkd->mfd", bernstein, ctrl).reshape(-1, 2)
+    poly_cid = np.repeat(seg_cid, counts)
+
+    # 折れ線の各頂点の次の頂点（輪郭の最後は最初に戻る）
+    boundary = np.append(poly_cid[1:] != poly_cid[:-1], True)
+    group_start = np.maximum.accumulate(np.where(np.append(True, boundary[:-1]), np.arange(len(poly)), 0))
+    next_index = np.where(boundary, group_start, np.arange(1, len(poly) + 1))
+    a, b = poly, poly[next_index]
+
+    # 面積（y 上向きの座標系で、反時計回りが正）
+    area = 0.5 * np.bincount(poly_cid, a[:, 0] * b[:, 1] - b[:, 0] * a[:, 1], minlength=n_contours)
+    clockwise_flags = [glyph_data['contours'][ci].get('clockwise') for ci in contour_indices]
+    known = np.array([c is not None for c in clockwise_flags])
+    clockwise = np.array([bool(c) for c in clockwise_flags])
+    zero_area = np.abs(area) < min_area
+    flipped = ~zero_area & known & ((area < 0) != clockwise)
+    first_vertex = np.zeros((n_contours, 2))
+    first_vertex[poly_cid[::-1]] = poly[::-1]
+    rounded_area = np.round(area, 2)
+    report("zero_area", zero_area, first_vertex, area=rounded_area)
+    report("flipped_winding", flipped, first_vertex, area=rounded_area)
+
+    # 自己交差（輪郭ごとに1件にまとめ、最初の交点の位置を記録する）
+    i, j = _segment_crossings(a, b, poly_cid, next_index)
+    if len(i):
+        d = b[i] - a[i]
+        e = b[j] - a[j]
+        denom = d[:, 0] * e[:, 1] - d[:, 1] * e[:, 0]
+        tt = ((a[j, 0] - a[i, 0]) * e[:, 1] - (a[j, 1] - a[i, 1]) * e[:, 0]) / denom
+        points = a[i] + tt[:, None] * d
+        crossing_count = np.bincount(poly_cid[i], minlength=n_contours)
+        first_point = np.zeros((n_contours, 2))
+        first_point[poly_cid[i][::-1]] = points[::-1]
+        report("self_intersection", crossing_count > 0, first_point, count=crossing_count)
+    return issues
+
+
+class OutlineValidator(GlyphEffect):
+    """アウトラインの検査
+
+    エフェクト適用後のグリフの退化・輪郭の向きの反転・自己交差などを検査し、
+    問題があれば glyph_data['issues'] に記録する。アウトラインは変更しない。
+    """
+    def __init__(self, min_area: float = 1.0, curve_steps: int = 8):
+        """
+        Args:
+            min_area: これより面積の小さい輪郭を問題とする（平方ユニット）
+            curve_steps: 曲線を折れ線にする分割数
+        """
+        self.min_area = min_area
+        self.curve_steps = curve_steps
+
+    def apply(self, glyph_data: Dict[str, Any]) -> Dict[str, Any]:
+        issues = validate_glyph(glyph_data, self.min_area, self.curve_steps)
+        if issues:
+            glyph_data['issues'] = issues
+        return glyph_data
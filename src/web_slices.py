@@ -0,0 +1,181 @@
+import os
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from processor import TARGET_BLOCKS
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FREQUENCY_FILE = os.path.join(SRC_DIR, "..", "subset.txt")
+WEIGHT_CLASSES = {
+    "Thin": 100, "ExtraLight": 200, "Light": 300, "Regular": 400, "Medium": 500,
+    "SemiBold": 600, "Bold": 700, "ExtraBold": 800, "Black": 900,
+}
+
+
+def plan_slices(codepoints, frequency_text="", slice_size=500):
+    """フォントの全コードポイントをスライスに分ける
+
+    1つ目は頻出文字（frequency_text に含まれる文字）、以降は TARGET_BLOCKS の
+    ブロックごと、最後にその他の文字を、それぞれ slice_size 文字ずつに分ける。
+
+    Returns:
+        List[List[int]]: スライスごとのコードポイント
+    """
+    remaining = set(codepoints)
+    slices = []
+
+    first = []
+    for char in frequency_text:
+        cp = ord(char)
+        if cp in remaining:
+            first.append(cp)
+            remaining.discard(cp)
+    if first:
+        slices.append(sorted(first))
+
+    def add_chunks(cps):
+        cps = sorted(cps)
+        for i in range(0, len(cps), slice_size):
+            slices.append(cps[i:i + slice_size])
+
+    for start, end, _ in TARGET_BLOCKS:
+        block = {cp for cp in remaining if start <= cp <= end}
+        remaining -= block
+        add_chunks(block)
+    add_chunks(remaining)
+    return slices
+
+
+def format_unicode_range(codepoints):
+    """コードポイントの列を CSS の unicode-range 表記にする（連続する範囲はまとめる）"""
+    parts = []
+    cps = sorted(codepoints)
+    i = 0
+    while i < len(cps):
+        j = i
+        while j + 1 < len(cps) and cps[j + 1] == cps[j] + 1:
+            j += 1
+        parts.append(f"U+{cps[i]:X}" if i == j else f"U+{cps[i]:X}-{cps[j]:X}")
+        i = j + 1
+    return ", ".join(parts)
+
+
+def build_slice_worker(job):
+    """1スライス分の WOFF2 を書き出す（ワーカープロセスで実行される）"""
+    font_path, output_path, codepoints = job
+    from fontTools.ttLib import TTFont
+    from fontTools import subset
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.name_languages = ["*"]
+    options.notdef_outline = True
+    options.glyph_names = False
+
+    font = TTFont(font_path)
+    subsetter = subset.Subsetter(options=options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    subset.save_font(font, output_path, options)
+    return output_path, os.path.getsize(output_path)
+
+
+def write_slices(font_path, output_dir=None, frequency_text="", slice_size=500, max_workers=None, force=False):
+    """ビルド済みフォントを unicode-range 付きの WOFF2 スライスと CSS に分割する
+
+    Args:
+        font_path: ビルド済みの OTF
+        output_dir: 出力先（既定は `<フォント>.slices/`）
+        frequency_text: 最初のスライスにまとめる頻出文字
+        slice_size: 1スライスあたりの最大文字数
+        max_workers: スライスを並列に書き出すプロセス数
+        force: 既存のスライスがフォントより新しくても作り直す
+
+    Returns:
+        str: 生成した CSS のパス（cmap が空でスライスがなければ None）
+    """
+    from fontTools.ttLib import TTFont
+
+    stem = os.path.splitext(os.path.basename(font_path))[0]
+    output_dir = output_dir or os.path.splitext(font_path)[0] + ".slices"
+    css_path = os.path.join(output_dir, f"{stem}.css")
+    if not force and os.path.exists(css_path) and os.path.getmtime(css_path) > os.path.getmtime(font_path):
+        print(f"[{datetime.datetime.now()}] Web slices up to date: {css_path}")
+        return css_path
+    os.makedirs(output_dir, exist_ok=True)
+    # スライス数が変わった場合に古いスライスが残らないようにする
+    for name in os.listdir(output_dir):
+        if name.startswith(f"{stem}.") and name.endswith(".woff2"):
+            os.remove(os.path.join(output_dir, name))
+
+    font = TTFont(font_path, lazy=True)
+    codepoints = (font.getBestCmap() or {}).keys()
+    name_table = font["name"]
+    family = name_table.getDebugName(16) or name_table.getDebugName(1)
+    style = name_table.getDebugName(17) or name_table.getDebugName(2)
+    weight = WEIGHT_CLASSES.get(style) or (font["OS/2"].usWeightClass if "OS/2" in font else 400)
+    font.close()
+
+    slices = plan_slices(codepoints, frequency_text, slice_size)
+    if not slices:
+        # cmap が空なら unicode-range で配信できる文字がない
+        if os.path.exists(css_path):
+            os.remove(css_path)
+        print(f"[{datetime.datetime.now()}] Warning: {font_path} maps no characters, skipping web slices")
+        return None
+    print(f"[{datetime.datetime.now()}] Writing {len(slices)} WOFF2 slices to {output_dir}...")
+    jobs = [(font_path, os.path.join(output_dir, f"{stem}.{i:03d}.woff2"), cps) for i, cps in enumerate(slices)]
+
+    if max_workers == 1:
+        results = [build_slice_worker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(build_slice_worker, jobs))
+
+    rules = []
+    for (_, _, cps), (path, _) in zip(jobs, results):
+        rules.append(
+            "@font-face {\n"
+            f"  font-family: \"{family}\";\n"
+            f"  font-weight: {weight};\n"
+            "  font-display: swap;\n"
+            f"  src: url(\"{os.path.basename(path)}\") format(\"woff2\");\n"
+            f"  unicode-range: {format_unicode_range(cps)};\n"
+            "}\n"
+        )
+    with open(css_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(rules))
+
+    total = sum(size for _, size in results)
+    print(f"[{datetime.datetime.now()}] Wrote {css_path} ({len(results)} slices, {total:,} bytes, "
+          f"first slice {results[0][1]:,} bytes)")
+    return css_path
+
+
+def read_frequency_file(path):
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    if path:
+        print(f"Warning: Frequency file not found: {path}")
+    return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a built font into unicode-range WOFF2 slices with @font-face CSS.")
+    parser.add_argument("font", help="Built OTF file")
+    parser.add_argument("--output-dir", help="Output directory (default: <font>.slices)")
+    parser.add_argument("--frequency-file", default=DEFAULT_FREQUENCY_FILE, help="Characters for the first slice (default: subset.txt)")
+    parser.add_argument("--slice-size", type=int, default=500, help="Maximum characters per slice (default: 500)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="Number of worker processes (default: half of cores)")
+    parser.add_argument("--force", action="store_true", help="Rewrite slices even if they are up to date")
+    args = parser.parse_args()
+
+    write_slices(args.font, args.output_dir, read_frequency_file(args.frequency_file),
+                 slice_size=args.slice_size, max_workers=args.workers, force=args.force)
+
+
+if __name__ == "__main__":
+    main()